@@ -4,16 +4,21 @@ import sys
 import os
 from os import path
 from tempfile import NamedTemporaryFile
-from .config import Config
+from .config import Config, LazyConfig
 from .validator import Validator
 from .validator.nodes import CLI_TYPES
 from .builder import Builder
-from .loader import Loader, ConfigLoader, ValidatorLoader
+from .loader import Loader, ConfigLoader, ValidatorLoader, AsyncConfigLoader
+from .cache import CodeCache, DirectoryIndex, BranchCache
+from .shared import SharedConfig
+from .batch import read_manifest, render_batch, write_config
+from .extra import collect_extra
 
 __version__ = (0, 3, 5)
 
-__all__ = ["Config", "Validator", "Builder", "Loader", "ConfigLoader",
-           "ValidatorLoader"]
+__all__ = ["Config", "LazyConfig", "Validator", "Builder", "Loader", "ConfigLoader",
+           "ValidatorLoader", "AsyncConfigLoader", "CodeCache", "DirectoryIndex",
+           "BranchCache", "SharedConfig"]
 
 def version():
     return ".".join(map(str, __version__))
@@ -44,7 +49,7 @@ def cli_parser():
                         help="write result to output file. If not set, result write to stdout")
     parser.add_argument("-t", "--type",
                         default="json",
-                        choices=("json", "yaml"),
+                        choices=("json", "yaml", "snapshot"),
                         help="format output data")
     parser.add_argument("--yaml-canonical",
                         action="store_true",
@@ -65,13 +70,105 @@ Ex: $ echo 'FOO=True' | execconf -i /some/dir""")
                         action="append",
                         metavar=("KEY", "VALUE", "VALIDATE"),
                         help=("extra options. Validation types: %s" % ",".join(CLI_TYPES.keys())))
+    parser.add_argument("--extra-env",
+                        metavar="PREFIX",
+                        help="extra options from environment variables with prefix")
+    parser.add_argument("--extra-file",
+                        action="append",
+                        metavar="FILE",
+                        help="extra options from JSON or KEY=VALUE file, - is stdin")
+    parser.add_argument("--batch",
+                        type=path_type,
+                        metavar="MANIFEST",
+                        help="render all jobs of JSON manifest: [{\"input\": ..., \"output\": ..., \"extra\": {...}}, ...]. Extra options of command line are set for every job, extra of job overrides them")
+    parser.add_argument("-j", "--jobs",
+                        type=int,
+                        default=1,
+                        help="number of processes for --batch")
+    parser.add_argument("--stats",
+                        action="store_true",
+                        help="print timings of load phases and files to stderr")
     
     # parse sys.argv
     return parser
     
+# options which have no meaning for --batch
+BATCH_IGNORED = (("input", "-i/--input"),
+                 ("output", "-o/--output"),
+                 ("root_dir", "--root-dir"),
+                 ("stats", "--stats"))
+
+def cli_check(parser, args):
+    if args.batch:
+        for name, option in BATCH_IGNORED:
+            if getattr(args, name):
+                parser.error("argument %s: not allowed with argument --batch" % option)
+
+def cli_validator(args):
+    validate = args.get("validate")
+    if not validate:
+        return None
+    validate_dirname, validate_filepath = path.split(validate)
+    validator_loader = ValidatorLoader(validate_dirname,
+                                       exts=args.get("extension"))
+    return validator_loader.load(validate_filepath)
+
+def cli_extra(args, validator=None):
+    # extra options
+    extra_data = {}
+    extras = args.get("extra")
+    if extras:
+        for extra in extras:
+            key, value, vtype = extra
+            try:
+                check = CLI_TYPES[vtype]
+            except KeyError:
+                raise ValueError("unknown validation type %s" % vtype)
+            else:
+                extra_data[key] = check.check(value)
+
+    # bulk extra options are checked by validator nodes of their keys,
+    # -e options override them
+    extra_files = args.get("extra_file") or []
+    extra_stream = None
+    if "-" in extra_files:
+        if not args.get("input") and not args.get("batch"):
+            raise ValueError("stdin is used for input, extra options can't be read from it")
+        extra_stream = sys.stdin
+        extra_files = [f for f in extra_files if f != "-"]
+    bulk_extra = collect_extra(env_prefix=args.get("extra_env"),
+                               filepaths=extra_files,
+                               stream=extra_stream,
+                               validator=validator)
+    if bulk_extra:
+        bulk_extra.update(extra_data)
+        extra_data = bulk_extra
+    return extra_data
+
+def cli_batch(args):
+    exts = args.get("extension")
+    validator = cli_validator(args)
+
+    failed = render_batch(read_manifest(args.get("batch")),
+                          processes=args.get("jobs"),
+                          exts=exts,
+                          defaults=args.get("defaults"),
+                          validator=validator,
+                          extra=cli_extra(args, validator),
+                          formatter=args.get("type"),
+                          canonical=args.get("yaml_canonical", False),
+                          pretty_print=not args.get("json_ugly", False))
+    for job, error in failed:
+        sys.stderr.write("%s: %s\n" % (job["input"], error))
+    if failed:
+        raise SystemExit(1)
+
 def cli_namespace(args):
     args = vars(args)
 
+    if args.get("batch"):
+        return cli_batch(args)
+
     # filepath
     filepath = None
     directory = None
@@ -85,8 +182,9 @@ def cli_namespace(args):
     # output
     output = None
     ns_output = args.get("output")
+    formatter = args.get("type")
     if ns_output:
-        output = open(ns_output, "w")
+        output = open(ns_output, "wb" if formatter == "snapshot" else "w")
     else:
         output = sys.stdout
 
@@ -118,51 +216,32 @@ def cli_namespace(args):
     # exts
     exts = args.get("extension")
 
-    # extra options
-    extra_data = {}
-    extras = args.get("extra")
-    if extras:
-        for extra in extras:
-            key, value, vtype = extra
-            try:
-                check = CLI_TYPES[vtype]
-            except KeyError:
-                raise ValueError("unknown validation type %s" % vtype)
-            else:
-                extra_data[key] = check.check(value)
-
     # validation
-    validator = None
-    validate = args.get("validate")
-    if validate:
-        validate_dirname, validate_filepath = path.split(validate)
-        validator_loader = ValidatorLoader(validate_dirname, exts=exts)
-        validator = validator_loader.load(validate_filepath)
+    validator = cli_validator(args)
+
+    # extra options
+    extra_data = cli_extra(args, validator)
 
     try:
         loader = ConfigLoader(directory,
                               exts=exts,
                               defaults=defaults,
-                              validator=validator)
+                              validator=validator,
+                              stats=args.get("stats", False))
         conf = loader.load(filepath, extra=extra_data)
+        if args.get("stats"):
+            sys.stderr.write(loader.stats().format())
+            sys.stderr.write("\n")
     except:
         raise
     else:
-        # formatter
-        formatter = args.get("type")
-        formatter_kw = {}
-        if formatter == "yaml":
-            if args.get("yaml_canonical", False):
-                formatter_kw["canonical"] = True
-            result = conf._to_yaml(**formatter_kw)
-        elif formatter == "json":
-            if args.get("json_ugly", False):
-                formatter_kw["pretty_print"] = False
-            result = conf._to_json(**formatter_kw)
-
-        # write result to stream
-        output.write(result)
-        output.write("\n")
+        key = None
+        if isinstance(filepath, basestring):
+            key = loader.snapshot_key(filepath, extra_data)
+        write_config(conf, output, formatter,
+                     loader=loader, key=key,
+                     canonical=args.get("yaml_canonical", False),
+                     pretty_print=not args.get("json_ugly", False))
     finally:
         # remove temp_file
         if temp_file:
@@ -174,5 +253,6 @@ def cli_namespace(args):
 def main():
     parser = cli_parser()
     args = parser.parse_args()
+    cli_check(parser, args)
     cli_namespace(args)
 
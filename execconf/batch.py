@@ -0,0 +1,148 @@
+from __future__ import absolute_import
+from os import path
+from multiprocessing import Pool
+try:
+    import simplejson as json
+except ImportError:
+    import json
+from .loader import ConfigLoader
+from .cache import CodeCache, DirectoryIndex, BranchCache
+
+__all__ = ["BatchRenderer", "render_batch", "read_manifest", "write_config"]
+
+
+def write_config(conf, output, formatter="json", loader=None, key=None,
+                 canonical=False, pretty_print=True):
+    if formatter == "yaml":
+        conf._dump_yaml(output, canonical=canonical)
+    elif formatter == "json":
+        conf._dump_json(output, pretty_print=pretty_print)
+    elif formatter == "snapshot":
+        manifest = loader.manifest() if loader is not None else None
+        output.write(conf._to_snapshot(manifest=manifest, key=key))
+    else:
+        raise ValueError("unknown output type %s" % formatter)
+
+    if formatter != "snapshot":
+        output.write("\n")
+
+
+def read_manifest(filepath):
+    '''Read JSON list of jobs. Job is dict with "input" and "output" paths
+    and optional "extra" dict and "type". Relative paths are relative to
+    manifest directory.'''
+    with open(filepath) as f:
+        jobs = json.load(f)
+    if not isinstance(jobs, list):
+        raise ValueError("batch manifest must be list of jobs")
+
+    directory = path.dirname(path.abspath(filepath))
+    ret = []
+    for job in jobs:
+        if not isinstance(job, dict) or "input" not in job or "output" not in job:
+            raise ValueError("job must have input and output: %r" % (job,))
+        job = dict(job)
+        job["input"] = path.join(directory, job["input"])
+        job["output"] = path.join(directory, job["output"])
+        ret.append(job)
+    return ret
+
+
+class BatchRenderer(object):
+    '''Renders many configs in one process. Loader of every directory is
+    created once and all loaders share compiled code, directory listings
+    and data of executed files.'''
+
+    def __init__(self, exts=None, defaults=None, validator=None,
+                 formatter="json", code_cache=None, branch_cache=None,
+                 extra=None, **formatter_kw):
+        if code_cache is None:
+            code_cache = CodeCache(max_size=4096)
+        if branch_cache is None:
+            branch_cache = BranchCache()
+        self._exts = exts
+        self._defaults = defaults
+        self._validator = validator
+        self._formatter = formatter
+        self._formatter_kw = formatter_kw
+        # extra options of every job
+        self._extra = extra or {}
+        self._code_cache = code_cache
+        self._branch_cache = branch_cache
+        self._dir_index = DirectoryIndex()
+        self._loaders = {}
+
+    def loader(self, directory):
+        directory = path.abspath(directory)
+        try:
+            return self._loaders[directory]
+        except KeyError:
+            pass
+        loader = self._loaders[directory] = ConfigLoader(
+                directory,
+                exts=self._exts,
+                defaults=self._defaults,
+                validator=self._validator,
+                code_cache=self._code_cache,
+                branch_cache=self._branch_cache,
+                dir_index=self._dir_index)
+        return loader
+
+    def render(self, job):
+        directory, filepath = path.split(job["input"])
+        extra = dict(self._extra)
+        extra.update(job.get("extra") or {})
+        formatter = job.get("type", self._formatter)
+
+        loader = self.loader(directory)
+        conf = loader.load(filepath, extra=extra)
+        mode = "wb" if formatter == "snapshot" else "w"
+        with open(job["output"], mode) as output:
+            write_config(conf, output, formatter,
+                         loader=loader,
+                         key=loader.snapshot_key(filepath, extra),
+                         **self._formatter_kw)
+
+
+def _render_job(renderer, item):
+    index, job = item
+    try:
+        renderer.render(job)
+    except Exception, e:
+        return index, "%s: %s" % (e.__class__.__name__, e)
+    return index, None
+
+
+# renderer of current batch worker process
+_batch_renderer = None
+
+def _init_batch_worker(kwargs):
+    global _batch_renderer
+    _batch_renderer = BatchRenderer(**kwargs)
+
+def _render_batch_job(item):
+    return _render_job(_batch_renderer, item)
+
+
+def render_batch(jobs, processes=None, **kwargs):
+    '''Render every job, kwargs are passed to BatchRenderer. Returns list
+    of (job, error message) for failed jobs.'''
+    items = list(enumerate(jobs))
+    if processes is not None and processes > 1 and len(items) > 1:
+        # jobs of one directory go to the same chunks,
+        # so workers execute less files
+        items.sort(key=lambda item: path.dirname(path.abspath(item[1]["input"])))
+        chunksize = max(1, len(items) // (processes * 4))
+        pool = Pool(processes, _init_batch_worker, (kwargs,))
+        try:
+            results = pool.map(_render_batch_job, items, chunksize)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        renderer = BatchRenderer(**kwargs)
+        results = [_render_job(renderer, item) for item in items]
+
+    results.sort()
+    return [(jobs[index], error) for index, error in results
+            if error is not None]
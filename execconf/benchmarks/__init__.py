@@ -0,0 +1,185 @@
+"""Benchmarks of config pipeline phases on synthetic config trees.
+
+Run ``python -m execconf.benchmarks --help`` for options. Results are
+printed as JSON, times are in seconds."""
+import sys
+import os
+from os import path
+import time
+import json
+import random
+import shutil
+import argparse
+from tempfile import mkdtemp
+
+__all__ = ["generate_tree", "generate_validator", "run_benchmarks"]
+
+VALUE_TYPES = ("str", "int", "dict")
+
+
+def _make_value(rnd, kind, name):
+    if kind == "str":
+        return repr("%s_%i" % (name, rnd.randint(0, 1 << 16)))
+    if kind == "int":
+        return repr(rnd.randint(0, 1 << 16))
+    items = ", ".join("%r: %i" % ("sub_%i" % i, rnd.randint(0, 1 << 16))
+                      for i in xrange(rnd.randint(1, 4)))
+    return "{%s}" % items
+
+
+def generate_tree(directory, depth=3, fanout=3, keys=20,
+                  mix=(1, 1, 1), seed=0):
+    '''Write config tree to directory and return name of root file.
+
+    Every file which is not a leaf merges fanout child files, tree has
+    depth levels. Each file sets keys variables, their types are chosen
+    from str, int and dict with weights of mix. Key names are shared
+    between files, so merging has conflicts on every level.'''
+    rnd = random.Random(seed)
+    total = float(sum(mix))
+    bounds = []
+    acc = 0
+    for weight in mix:
+        acc += weight / total
+        bounds.append(acc)
+
+    def kind_of(i):
+        # type of key is the same in all files
+        x = random.Random("%s-%i" % (seed, i)).random()
+        for kind, bound in zip(VALUE_TYPES, bounds):
+            if x < bound:
+                return kind
+        return VALUE_TYPES[-1]
+
+    def write(name, level):
+        lines = []
+        if level < depth:
+            for i in xrange(fanout):
+                child = "%s_%i" % (name, i)
+                write(child, level + 1)
+                lines.append("merge(%r)" % child)
+        for i in xrange(keys):
+            key = "KEY_%i" % i
+            lines.append("%s = %s" % (key, _make_value(rnd, kind_of(i), key)))
+        with open(path.join(directory, "%s.py" % name), "w") as f:
+            f.write("\n".join(lines))
+            f.write("\n")
+
+    write("root", 1)
+    return "root.py"
+
+
+def generate_validator(data):
+    '''Build validator which declares every key of data by its type'''
+    from ..validator import Validator
+    from ..validator.nodes import Dict, String, Integer
+
+    def node_of(value):
+        if isinstance(value, dict):
+            return Dict(dict((k, node_of(v)) for k, v in value.iteritems()))
+        if isinstance(value, (int, long)):
+            return Integer()
+        return String()
+
+    return Validator(node_of(data))
+
+
+def _timeit(func, repeat):
+    times = []
+    result = None
+    for i in xrange(repeat):
+        start = time.time()
+        result = func()
+        times.append(time.time() - start)
+    return result, {"min": min(times),
+                    "mean": sum(times) / len(times),
+                    "max": max(times)}
+
+
+def run_benchmarks(depth=3, fanout=3, keys=20, mix=(1, 1, 1),
+                   repeat=5, seed=0):
+    '''Time each phase separately and return dict with results'''
+    from ..loader import ConfigLoader
+    from ..config import Config
+    from ..helpers import MergeHelper
+
+    directory = mkdtemp(prefix="execconf_bench_")
+    try:
+        root = generate_tree(directory, depth=depth, fanout=fanout,
+                             keys=keys, mix=mix, seed=seed)
+        files = len(os.listdir(directory))
+        phases = {}
+
+        conf, phases["load"] = _timeit(
+            lambda: ConfigLoader(directory).load(root), repeat)
+        data = conf._to_dict()
+
+        # the same merge as loader runs for merge() of files
+        merge = MergeHelper().merge
+        _, phases["merge"] = _timeit(
+            lambda: merge(data, data), repeat)
+
+        validator = generate_validator(data)
+        _, phases["validate"] = _timeit(
+            lambda: validator.validate(data), repeat)
+
+        _, phases["config"] = _timeit(
+            lambda: Config(data), repeat)
+
+        _, phases["to_json"] = _timeit(conf._to_json, repeat)
+
+        try:
+            _, phases["to_yaml"] = _timeit(conf._to_yaml, repeat)
+        except NotImplementedError:
+            pass
+    finally:
+        shutil.rmtree(directory)
+
+    return {"params": {"depth": depth,
+                       "fanout": fanout,
+                       "keys": keys,
+                       "mix": dict(zip(VALUE_TYPES, mix)),
+                       "repeat": repeat,
+                       "seed": seed},
+            "files": files,
+            "phases": phases}
+
+
+def cli_parser():
+    parser = argparse.ArgumentParser(
+            description="Execconf pipeline benchmarks")
+    parser.add_argument("--depth", type=int, default=3,
+                        help="levels of config tree")
+    parser.add_argument("--fanout", type=int, default=3,
+                        help="merged files in every not leaf file")
+    parser.add_argument("--keys", type=int, default=20,
+                        help="keys per file")
+    parser.add_argument("--mix", default="1,1,1",
+                        help="weights of str,int,dict values")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output",
+                        type=argparse.FileType("w"),
+                        default=sys.stdout)
+    return parser
+
+
+def main():
+    append_path = path.normpath(path.join(path.dirname(path.abspath(__file__)),
+                                          "../.."))
+    sys.path.insert(0, append_path)
+
+    parser = cli_parser()
+    args = parser.parse_args()
+    try:
+        mix = tuple(float(w) for w in args.mix.split(","))
+    except ValueError:
+        mix = ()
+    if len(mix) != len(VALUE_TYPES) or not sum(mix) > 0:
+        parser.error("--mix must be %i comma separated weights" % len(VALUE_TYPES))
+
+    results = run_benchmarks(depth=args.depth, fanout=args.fanout,
+                             keys=args.keys, mix=mix,
+                             repeat=args.repeat, seed=args.seed)
+    json.dump(results, args.output, indent=4, sort_keys=True)
+    args.output.write("\n")
@@ -0,0 +1,3 @@
+if __name__ == "__main__":
+    from __init__ import main
+    main()
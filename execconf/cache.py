@@ -0,0 +1,235 @@
+import os
+from os import path
+import marshal
+import hashlib
+import imp
+import time
+from tempfile import NamedTemporaryFile
+from collections import OrderedDict
+
+__all__ = ["CodeCache", "DirectoryIndex", "BranchCache"]
+
+
+class CodeCache(object):
+    '''Cache of compiled code objects of config files.
+
+    Entries are keyed by (fullpath, mtime, size, sha1 of source), kept in
+    memory with LRU eviction and optionally stored on disk in marshal
+    format, so a cache directory may be shared between processes.'''
+
+    def __init__(self, max_size=512, directory=None):
+        assert max_size >= 1
+        self._max_size = max_size
+        self._directory = directory
+        self._codes = OrderedDict()
+
+    def __len__(self):
+        return len(self._codes)
+
+    def clear(self):
+        self._codes.clear()
+
+    def _read_source(self, fullpath):
+        with open(fullpath, "rU") as f:
+            source = f.read()
+        return source
+
+    def _make_key(self, fullpath, source):
+        st = os.stat(fullpath)
+        digest = hashlib.sha1(source).hexdigest()
+        return (fullpath, st.st_mtime, st.st_size, digest)
+
+    def _disk_filepath(self, key):
+        name = hashlib.sha1(repr(key)).hexdigest()
+        return path.join(self._directory, "%s.execc" % name)
+
+    def _load_disk(self, key):
+        try:
+            with open(self._disk_filepath(key), "rb") as f:
+                raw = f.read()
+        except (IOError, OSError):
+            return None
+
+        magic = imp.get_magic()
+        if not raw.startswith(magic):
+            return None
+        try:
+            return marshal.loads(raw[len(magic):])
+        except (ValueError, EOFError, TypeError):
+            return None
+
+    def _store_disk(self, key, code):
+        # disk is optional, code stays in memory if it can't be stored
+        f = None
+        try:
+            f = NamedTemporaryFile(mode="wb",
+                                   prefix="excc_",
+                                   dir=self._directory,
+                                   delete=False)
+            f.write(imp.get_magic())
+            f.write(marshal.dumps(code))
+            f.close()
+            os.rename(f.name, self._disk_filepath(key))
+        except (IOError, OSError):
+            if f is not None:
+                f.close()
+                if path.exists(f.name):
+                    os.remove(f.name)
+
+    def _put(self, key, code):
+        codes = self._codes
+        codes[key] = code
+        while len(codes) > self._max_size:
+            codes.popitem(last=False)
+
+    def get_code(self, fullpath):
+        source = self._read_source(fullpath)
+        key = self._make_key(fullpath, source)
+
+        codes = self._codes
+        try:
+            code = codes.pop(key)
+        except KeyError:
+            code = None
+        else:
+            # move to the end as most recently used
+            codes[key] = code
+            return code
+
+        if self._directory is not None:
+            code = self._load_disk(key)
+
+        if code is None:
+            code = compile(source, fullpath, "exec", dont_inherit=True)
+            if self._directory is not None:
+                self._store_disk(key, code)
+
+        self._put(key, code)
+        return code
+
+
+class DirectoryIndex(object):
+    '''Listings of config directories used to resolve file names.
+
+    Each directory is read once and listed again only when its mtime is
+    changed. The mtime is checked at most once per generation, loader
+    starts new generation on every load.'''
+
+    # directory changed within this interval may be changed again
+    # without visible mtime change
+    racy_interval = 2
+
+    def __init__(self):
+        self._generation = 0
+        self._listings = {}
+
+    def __len__(self):
+        return len(self._listings)
+
+    def clear(self):
+        self._listings.clear()
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def next_generation(self):
+        self._generation += 1
+
+    def _list(self, directory):
+        try:
+            listing = self._listings[directory]
+        except KeyError:
+            listing = None
+        else:
+            if listing[0] == self._generation:
+                return listing[2]
+
+        try:
+            mtime = os.stat(directory).st_mtime
+        except OSError:
+            mtime = None
+
+        if listing is not None and mtime is not None and listing[1] == mtime:
+            names = listing[2]
+        elif mtime is None:
+            names = frozenset()
+        else:
+            try:
+                names = frozenset(os.listdir(directory))
+            except OSError:
+                names = frozenset()
+            if time.time() - mtime < self.racy_interval:
+                # list again on next check
+                mtime = None
+
+        self._listings[directory] = (self._generation, mtime, names)
+        return names
+
+    def exists(self, fullpath):
+        directory, name = path.split(path.normpath(fullpath))
+        return name in self._list(directory)
+
+    def find_ext(self, fullpath, exts):
+        '''Return first extension from exts for which file exists'''
+        directory, name = path.split(path.normpath(fullpath))
+        names = self._list(directory)
+        for ext in exts:
+            if "%s.%s" % (name, ext) in names:
+                return ext
+        return None
+
+
+class BranchCache(object):
+    '''Cache of executed config files shared between loads and loaders.
+
+    Entry keeps filtered data of file, helpers calls made by it and paths
+    probed while included names were resolved, so included files are
+    handled again without executing the file. Entries are keyed by loader
+    directory, file path, extensions and helpers injected to file globals
+    and are valid while file has the same (mtime, size, inode) and probed
+    paths are absent. Files must not depend on anything but their source
+    and helpers.'''
+
+    # file changed within this interval may be changed again
+    # with the same stat
+    racy_interval = 2
+
+    def __init__(self, max_size=4096):
+        assert max_size >= 1
+        self._max_size = max_size
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+
+    def fingerprint(self, fullpath):
+        try:
+            st = os.stat(fullpath)
+        except OSError:
+            return None
+        if time.time() - st.st_mtime < self.racy_interval:
+            return None
+        return (st.st_mtime, st.st_size, st.st_ino)
+
+    def get(self, key, fingerprint):
+        '''Return (data, calls, probed) or None'''
+        entries = self._entries
+        try:
+            entry = entries.pop(key)
+        except KeyError:
+            return None
+        if entry[0] != fingerprint:
+            return None
+        entries[key] = entry
+        return entry[1], entry[2], entry[3]
+
+    def put(self, key, fingerprint, data, calls, probed=()):
+        entries = self._entries
+        entries.pop(key, None)
+        entries[key] = (fingerprint, data, calls, tuple(probed))
+        while len(entries) > self._max_size:
+            entries.popitem(last=False)
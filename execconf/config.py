@@ -7,9 +7,80 @@ try:
     import yaml
 except ImportError:
     yaml = None
-from .utils import frozendict, to_primitive
+from .utils import frozendict, to_primitive, _frozen_item
+from .snapshot import dump_snapshot, load_snapshot
+from .shared import dump_shared
 
-__all__ = ["Config"]
+__all__ = ["Config", "LazyConfig"]
+
+
+if yaml:
+    class _SafeDumper(yaml.SafeDumper):
+        # config keeps set values as frozensets
+        pass
+    _SafeDumper.add_representer(frozenset, _SafeDumper.represent_set)
+
+
+def _yaml_node_events(dumper, node):
+    # events which yaml serializer emits for node without anchors
+    if isinstance(node, yaml.ScalarNode):
+        detected_tag = dumper.resolve(yaml.ScalarNode, node.value, (True, False))
+        default_tag = dumper.resolve(yaml.ScalarNode, node.value, (False, True))
+        implicit = (node.tag == detected_tag, node.tag == default_tag)
+        yield yaml.ScalarEvent(None, node.tag, implicit, node.value,
+                               style=node.style)
+    elif isinstance(node, yaml.SequenceNode):
+        implicit = node.tag == dumper.resolve(yaml.SequenceNode, node.value, True)
+        yield yaml.SequenceStartEvent(None, node.tag, implicit,
+                                      flow_style=node.flow_style)
+        for item in node.value:
+            for event in _yaml_node_events(dumper, item):
+                yield event
+        yield yaml.SequenceEndEvent()
+    else:
+        implicit = node.tag == dumper.resolve(yaml.MappingNode, node.value, True)
+        yield yaml.MappingStartEvent(None, node.tag, implicit,
+                                     flow_style=node.flow_style)
+        for key, value in node.value:
+            for event in _yaml_node_events(dumper, key):
+                yield event
+            for event in _yaml_node_events(dumper, value):
+                yield event
+        yield yaml.MappingEndEvent()
+
+
+def _yaml_events(dumper, value):
+    # dicts and lists are walked without building yaml nodes of whole tree,
+    # other values are represented by dumper one by one
+    flow_style = bool(dumper.default_flow_style)
+    if isinstance(value, dict):
+        yield yaml.MappingStartEvent(None, u"tag:yaml.org,2002:map", True,
+                                     flow_style=flow_style)
+        keys = list(value)
+        try:
+            keys.sort()
+        except TypeError:
+            pass
+        for k in keys:
+            for event in _yaml_events(dumper, k):
+                yield event
+            for event in _yaml_events(dumper, value[k]):
+                yield event
+        yield yaml.MappingEndEvent()
+    elif isinstance(value, (list, tuple)):
+        yield yaml.SequenceStartEvent(None, u"tag:yaml.org,2002:seq", True,
+                                      flow_style=flow_style)
+        for item in value:
+            for event in _yaml_events(dumper, item):
+                yield event
+        yield yaml.SequenceEndEvent()
+    else:
+        node = dumper.represent_data(value)
+        dumper.represented_objects = {}
+        dumper.object_keeper = []
+        dumper.alias_key = None
+        for event in _yaml_node_events(dumper, node):
+            yield event
 
 class Config(frozendict):
     def __init__(self, *args, **kwargs):
@@ -31,11 +102,165 @@ class Config(frozendict):
         if pretty_print:
             kw["indent"] = 4
             kw["sort_keys"] = True
-        return json.dumps(self.__dict__, **kw)
+        return json.dumps(self, **kw)
 
     def _to_yaml(self, canonical=False):
         if not yaml:
             raise NotImplementedError("yaml module is not installed")
-        return yaml.safe_dump(self._to_dict(), canonical=canonical)
+        # default of default_flow_style is changed in PyYAML 5.1
+        return yaml.dump(self._to_dict(), Dumper=_SafeDumper,
+                         canonical=canonical, default_flow_style=False)
+
+    def _dump_json(self, stream, pretty_print=True):
+        """Write JSON to stream by chunks"""
+        kw = {}
+        if pretty_print:
+            kw["indent"] = 4
+            kw["sort_keys"] = True
+        json.dump(self, stream, **kw)
+
+    def _dump_yaml(self, stream, canonical=False):
+        """Write YAML to stream by events, output is the same as _to_yaml
+        gives"""
+        if not yaml:
+            raise NotImplementedError("yaml module is not installed")
+        dumper = _SafeDumper(stream, canonical=canonical,
+                             default_flow_style=False,
+                             encoding="utf-8")
+        try:
+            dumper.emit(yaml.StreamStartEvent(encoding=dumper.use_encoding))
+            dumper.emit(yaml.DocumentStartEvent(explicit=dumper.use_explicit_start))
+            for event in _yaml_events(dumper, self):
+                dumper.emit(event)
+            dumper.emit(yaml.DocumentEndEvent(explicit=dumper.use_explicit_end))
+            dumper.emit(yaml.StreamEndEvent())
+        finally:
+            dumper.dispose()
+
+    def _set_origins(self, origins):
+        self.__dict__["_origins"] = origins
+        self.__dict__["_origins_index"] = None
+
+    def _origin(self, key):
+        """(fullpath, helper name) of file which set key last or None.
+        Origins are known if config is loaded with provenance=True"""
+        origins = self.__dict__.get("_origins")
+        if origins is None:
+            return None
+        return origins.get(key)
+
+    def _origin_keys(self, filepath):
+        """Keys which file set last"""
+        origins = self.__dict__.get("_origins")
+        if origins is None:
+            return []
+        index = self.__dict__["_origins_index"]
+        if index is None:
+            index = {}
+            for k, (origin_filepath, helper) in origins.iteritems():
+                index.setdefault(origin_filepath, []).append(k)
+            self.__dict__["_origins_index"] = index
+        return sorted(index.get(filepath, ()))
+
+    def _to_snapshot(self, manifest=None, key=None):
+        return dump_snapshot(self._to_dict(), manifest=manifest, key=key,
+                             origins=self.__dict__.get("_origins"))
+
+    def _to_shared(self, filepath):
+        dump_shared(self, filepath)
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        if not isinstance(snapshot, basestring):
+            snapshot = snapshot.read()
+        data, manifest, key, origins = load_snapshot(snapshot)
+        conf = cls(data)
+        if origins is not None:
+            conf._set_origins(origins)
+        return conf
+
+
+class LazyConfig(Config):
+    """Config which keeps data as is and converts nested dict's and list's
+    on first access. Data is not copied, so it must not be changed after."""
+
+    def __new__(cls, *args, **kw):
+        new = dict.__new__(cls)
+        dict.update(new, *args, **kw)
+        return new
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattribute__(self, k):
+        # the same lookup order as Config with items in __dict__ has:
+        # data descriptors of class, items, then other attributes
+        if dict.__contains__(self, k):
+            attr = getattr(type(self), k, None)
+            if attr is None or not hasattr(attr, "__set__"):
+                return self[k]
+        return object.__getattribute__(self, k)
+
+    def _wrap(self, value):
+        cls = self.__class__
+        if isinstance(value, dict):
+            if not isinstance(value, LazyConfig):
+                return cls(value)
+        elif isinstance(value, (list, tuple)):
+            return tuple(v if isinstance(v, LazyConfig) else _frozen_item(cls, v)
+                         for v in value)
+        elif isinstance(value, set):
+            return frozenset(value)
+        return None
+
+    def __getitem__(self, k):
+        value = dict.__getitem__(self, k)
+        if isinstance(value, tuple):
+            # converted lists and tuples are tuples too
+            wrapped_keys = self.__dict__.setdefault("_wrapped_keys", set())
+            if k in wrapped_keys:
+                return value
+        wrapped = self._wrap(value)
+        if wrapped is not None:
+            # replace with converted value, so it's done only once
+            dict.__setitem__(self, k, wrapped)
+            if isinstance(wrapped, tuple):
+                self.__dict__.setdefault("_wrapped_keys", set()).add(k)
+            value = wrapped
+        return value
+
+    def get(self, k, default=None):
+        if k in self:
+            return self[k]
+        return default
+
+    def itervalues(self):
+        for k in self:
+            yield self[k]
+
+    def iteritems(self):
+        for k in self:
+            yield k, self[k]
+
+    def values(self):
+        return list(LazyConfig.itervalues(self))
+
+    def items(self):
+        return list(LazyConfig.iteritems(self))
 
+    def __eq__(self, other):
+        if not isinstance(other, dict):
+            return NotImplemented
+        if len(self) != len(other):
+            return False
+        # items may hide methods
+        for k, v in LazyConfig.iteritems(self):
+            if k not in other or v != other[k]:
+                return False
+        return True
 
+    def __ne__(self, other):
+        eq = self.__eq__(other)
+        if eq is NotImplemented:
+            return eq
+        return not eq
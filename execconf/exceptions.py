@@ -1,7 +1,8 @@
 __all__ = ["Error", "AbsPathError", "NotFoundError",
            "NotFoundExtsError", "UndeclaredExtError",
            "CircularIncludeError", "UnknownFormatterError",
-           "ValidatorConvertError", "ValidatorCheckError"]
+           "ValidatorConvertError", "ValidatorCheckError",
+           "ValidatorErrors", "SnapshotError"]
 
 class Error(Exception):
     pass
@@ -43,7 +44,24 @@ class ValidatorCheckError(Error):
     pass
 
 
+class ValidatorErrors(ValidatorCheckError):
+    """All errors found by validation, errors is list of (path, error)"""
+
+    def __init__(self, errors, truncated=False):
+        self.errors = errors
+        self.truncated = truncated
+        lines = ["%i validation errors%s" % (len(errors),
+                                             " (truncated)" if truncated else "")]
+        for path, e in errors:
+            lines.append("%s: %s" % (path or "<root>", e))
+        super(ValidatorErrors, self).__init__("\n".join(lines))
+
+
 class ValidatorNodeError(Error):
     pass
 
 
+class SnapshotError(Error):
+    pass
+
+
@@ -0,0 +1,76 @@
+from __future__ import absolute_import
+import os
+try:
+    import simplejson as json
+except ImportError:
+    import json
+from .validator.nodes import List, Dict
+from .exceptions import ValidatorConvertError, ValidatorCheckError
+
+__all__ = ["collect_extra", "parse_env", "parse_extra_file"]
+
+
+def parse_env(prefix, environ=None):
+    '''Variables with prefix, prefix is removed from keys'''
+    if environ is None:
+        environ = os.environ
+    plen = len(prefix)
+    return dict((k[plen:], v) for k, v in environ.iteritems()
+                if k.startswith(prefix) and len(k) > plen)
+
+
+def parse_extra_file(f):
+    '''Parse JSON object or KEY=VALUE lines. Empty lines and lines
+    starting with # are skipped.'''
+    content = f.read()
+    if content.lstrip().startswith("{"):
+        data = json.loads(content)
+        if not isinstance(data, dict):
+            raise ValueError("extra file must contain JSON object")
+        return data
+
+    data = {}
+    for lineno, line in enumerate(content.splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        key, sep, value = line.partition("=")
+        key = key.strip()
+        if not sep or not key:
+            raise ValueError("line %i is not KEY=VALUE: %s" % (lineno, line))
+        data[key] = value.strip()
+    return data
+
+
+def _check_value(node, key, value):
+    try:
+        if isinstance(value, basestring) and isinstance(node, (List, Dict)):
+            try:
+                value = json.loads(value)
+            except ValueError, e:
+                raise ValidatorConvertError("value is not JSON: %s" % e)
+        return node.check(value)
+    except (ValidatorConvertError, ValidatorCheckError), e:
+        raise e.__class__("extra option %s: %s" % (key, e))
+
+
+def collect_extra(env_prefix=None, filepaths=None, stream=None,
+                  validator=None, environ=None):
+    '''Collect extra options from environment variables with env_prefix,
+    files and stream. Later sources override earlier ones. If validator is
+    set, every value is checked once by node declared for its key.'''
+    data = {}
+    if env_prefix:
+        data.update(parse_env(env_prefix, environ))
+    for filepath in filepaths or ():
+        with open(filepath) as f:
+            data.update(parse_extra_file(f))
+    if stream is not None:
+        data.update(parse_extra_file(stream))
+
+    if validator is not None:
+        for key, value in data.items():
+            node = validator.declared_node(key)
+            if node is not None:
+                data[key] = _check_value(node, key, value)
+    return data
@@ -1,6 +1,5 @@
 from os import path
-from copy import deepcopy
-from utils import deep_merge
+from utils import cow_merge, cow_update
 
 __all__ = ["DummyHelper", "IncludeHelper", "MergeHelper",
            "MergeOptionHelper"]
@@ -17,15 +16,16 @@ class BaseHelper(object):
     def merge(self, left, right, *args, **kwargs):
         return
 
+    def merged_keys(self, left, right, *args, **kwargs):
+        """Keys which merge takes from right"""
+        return right.keys()
+
 
 class DummyHelper(BaseHelper):
     NAME = "dummy"
     
     def merge(self, left, right, *args, **kwargs):
-        data = deepcopy(left)
-        if right:
-            data.update(deepcopy(right))
-        return data
+        return cow_update(left, right)
 
 
 class IncludeHelper(DummyHelper):
@@ -43,7 +43,7 @@ class MergeHelper(BaseHelper):
         loader.handle(filepath, helper=self)
 
     def merge(self, left, right):
-        return deep_merge(left, right)
+        return cow_merge(left, right)
 
 
 class MergeOptionHelper(BaseHelper):
@@ -59,15 +59,20 @@ class MergeOptionHelper(BaseHelper):
         else:
             options = set(options)
 
-        result = deepcopy(left)
+        result = dict(left)
         for o in options:
             if o in right:
                 if depth == 0:
-                    result[o] = deepcopy(right[o])
+                    result[o] = right[o]
                 else:
                     depth -= 1
-                    result[o] = deep_merge(result.get(o), right[o], depth=depth)
-        return result 
+                    result[o] = cow_merge(result.get(o), right[o], depth=depth)
+        return result
+
+    def merged_keys(self, left, right, options, depth=-1):
+        if not isinstance(options, (list, tuple)):
+            options = [options]
+        return [o for o in set(options) if o in right]
 
 
 
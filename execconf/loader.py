@@ -4,24 +4,77 @@ from os import path
 from types import ModuleType
 import runpy
 from tempfile import NamedTemporaryFile
-from .utils import recursive_fmt
-from .config import Config
+import threading
+import time
+import copy
+import hashlib
+import cPickle as pickle
+from collections import OrderedDict
+from multiprocessing.pool import Pool, ThreadPool
+from .utils import ReplacementEngine, make_hashable
+from .cache import DirectoryIndex
+from .stats import LoadStats, NULL_STATS
+from .config import Config, LazyConfig
 from .helpers import (DummyHelper, IncludeHelper, MergeHelper,
                       MergeOptionHelper)
 from .validator import Validator
 from .validator.nodes import Node, Dict, LOADER_GLOBALS
 from .builder import Builder
+from .snapshot import (read_snapshot, write_snapshot, build_manifest,
+                       check_manifest)
 from .exceptions import (AbsPathError, NotFoundError,
                          NotFoundExtsError, UndeclaredExtError,
                          FileHandleError, CircularIncludeError,
-                         UnknownFormatterError)
+                         UnknownFormatterError, SnapshotError)
+
+__all__ = ["Loader", "ConfigLoader", "ValidatorLoader", "AsyncConfigLoader"]
+
+# loader of current parallel worker process
+_parallel_loader = None
+
+def _init_parallel_worker(loader):
+    global _parallel_loader
+    _parallel_loader = loader
+
+def _run_parallel_branch(filepath):
+    return _parallel_loader._run_recorded_branch(filepath)
+
+
+class _IncludeRecorder(object):
+    """Stands for ConfigLoader in parallel worker. Helpers calls are recorded
+    and sent back to main process instead of handling included files."""
+
+    def __init__(self, parent_filepath):
+        self._parent_filepath = parent_filepath
+        self.calls = []
+
+    @property
+    def parent_filepath(self):
+        return self._parent_filepath
+
+    def parent_join(self, filepath):
+        return path.join(path.dirname(self._parent_filepath), filepath)
+
+    def handle(self, filepath, helper=None,
+            helper_args=None, helper_kwargs=None):
+        name = helper.NAME if helper else None
+        self.calls.append((filepath, name, helper_args, helper_kwargs))
 
-__all__ = ["Loader", "ConfigLoader", "ValidatorLoader"]
 
 class Loader(object):
     defaults_exts = ("py",)
 
-    def __init__(self, directory, exts=None, defaults=None):
+    # filtered data of defaults files shared by all loaders,
+    # least recently used files are dropped
+    _defaults_cache = OrderedDict()
+    _defaults_cache_size = 64
+    _defaults_cache_lock = threading.Lock()
+    # file changed within this interval may be changed again
+    # with the same mtime and size
+    _defaults_racy_interval = 2
+
+    def __init__(self, directory, exts=None, defaults=None,
+                 code_cache=None, dir_index=None, stats=False):
         self.directory = path.abspath(directory)
 
         if exts is not None:
@@ -35,9 +88,20 @@ class Loader(object):
 
         self._dummy_helper = DummyHelper()
         self._defaults = defaults
+        self._code_cache = code_cache
+        if dir_index is None:
+            dir_index = DirectoryIndex()
+        self._dir_index = dir_index
+        self._collect_stats = stats
+        self._stats = NULL_STATS
         self._data = {}
+        # resolved names are valid during one generation of dir_index
         self._resolved_filepaths = {}
+        self._resolved_generation = None
+        # full paths of files which would change resolved names
+        self._probed = set()
         self._defaults_data = None
+        self._defaults_fullpath = None
 
     def cleanup(self):
         self._data = {}
@@ -55,26 +119,28 @@ class Loader(object):
         filename, ext = path.splitext(filepath)
 
         if not ext:
-            found_filepath = None
-            for _ext in self._exts:
-                check_filepath = "%s.%s" % (filepath, _ext)
-                if path.exists(path.join(directory, check_filepath)):
-                    found_filepath = check_filepath
-                    break
-            if found_filepath is None:
+            found_ext = self._dir_index.find_ext(path.join(directory, filepath),
+                                                 self._exts)
+            if found_ext is None:
                 raise NotFoundExtsError("file %s not found in %s with any declared extensions: %s" % (filepath, directory, ", ".join(self._exts)))
 
             # set new filepath
-            filepath = found_filepath
+            filepath = "%s.%s" % (filepath, found_ext)
         elif ext[1:] not in self._exts:
             raise UndeclaredExtError("file %s has undeclared extension %s" % (filepath, ext))
         else:
-            if not path.exists(path.join(directory, filepath)):
+            if not self._dir_index.exists(path.join(directory, filepath)):
                 raise NotFoundError("file %s not found in %s" % (filepath, directory))
 
         return filepath
 
     def _resolve_filepath(self, filepath, force=False):
+        generation = self._dir_index.generation
+        if generation != self._resolved_generation:
+            # listings may be changed, names are resolved again
+            self._resolved_filepaths = {}
+            self._resolved_generation = generation
+
         ret = None
         if not force:
             try:
@@ -103,6 +169,17 @@ class Loader(object):
     
     def resolve_filepath(self, filepath):
         return self._resolve_filepath(filepath)
+
+    def _probed_filepaths(self, filepath, resolved, directory=None):
+        # files with extensions of higher priority than extension of
+        # resolved filepath, name is resolved the same while they are absent
+        if path.splitext(filepath)[1]:
+            return []
+        if directory is None:
+            directory = self.directory
+        name, ext = path.splitext(path.join(path.abspath(directory), resolved))
+        exts = self._exts
+        return ["%s.%s" % (name, e) for e in exts[:exts.index(ext[1:])]]
     
     def _filter_data(self, data):
         ret = {}
@@ -123,10 +200,62 @@ class Loader(object):
         if directory is None:
             directory = self.directory
         fullpath = path.join(directory, filepath)
-        data = runpy.run_path(fullpath, init_globals)
+        stats = self._stats
+        if stats.enabled:
+            # size is taken before execution, so errors of execution
+            # are not hidden
+            try:
+                size = path.getsize(fullpath)
+            except OSError:
+                size = 0
+            start = stats.start_file()
+        try:
+            if self._code_cache is not None:
+                data = self._run_code(fullpath, init_globals)
+            else:
+                data = runpy.run_path(fullpath, init_globals)
+        finally:
+            if stats.enabled:
+                stats.end_file(fullpath, start, size)
         data = self._filter_data(data)
         return data
+
+    def _run_code(self, fullpath, init_globals=None):
+        # same globals as runpy.run_path gives, but code from cache
+        code = self._code_cache.get_code(fullpath)
+        run_globals = {}
+        if init_globals is not None:
+            run_globals.update(init_globals)
+        run_globals.update(__name__="<run_path>",
+                           __file__=fullpath,
+                           __loader__=None,
+                           __package__=None)
+        exec code in run_globals
+        return run_globals
     
+    def _load_defaults_file(self, directory, filepath):
+        fullpath = path.abspath(path.join(directory, filepath))
+        key = (fullpath, self._filter_data.im_func)
+        st = os.stat(fullpath)
+        stat = (st.st_mtime, st.st_size, st.st_ino)
+        cache = self._defaults_cache
+        with self._defaults_cache_lock:
+            entry = cache.pop(key, None)
+            if entry is not None and entry[0] == stat:
+                # move to the end as most recently used
+                cache[key] = entry
+                return fullpath, entry[1]
+
+        data = self._run_path(filepath, directory=directory)
+        if time.time() - st.st_mtime >= self._defaults_racy_interval:
+            # cache keeps own copy of data
+            entry = (stat, copy.deepcopy(data))
+            with self._defaults_cache_lock:
+                cache[key] = entry
+                while len(cache) > self._defaults_cache_size:
+                    cache.popitem(last=False)
+        return fullpath, data
+
     def _load_defaults(self):
         defaults = self._defaults
         data = None
@@ -134,14 +263,20 @@ class Loader(object):
             if isinstance(defaults, basestring):
                 defaults_directory, defaults_filepath = path.split(defaults)
 
-                defaults_filepath = self._resolve_filepath_ext(defaults_filepath, 
-                        directory=defaults_directory)
-                data = self._run_path(defaults_filepath, 
+                resolved = self._resolve_filepath_ext(defaults_filepath,
                         directory=defaults_directory)
+                self._probed.update(self._probed_filepaths(
+                        defaults_filepath, resolved, defaults_directory))
+                defaults_filepath = resolved
+                self._defaults_fullpath, data = self._load_defaults_file(
+                        defaults_directory, defaults_filepath)
+            elif self._defaults_data is not None:
+                # module and dict are read once, on first load
+                data = self._defaults_data
             elif isinstance(defaults, ModuleType):
-                data = self._filter_data(vars(defaults))
+                data = copy.deepcopy(self._filter_data(vars(defaults)))
             elif isinstance(defaults, dict):
-                data = self._filter_data(defaults)
+                data = copy.deepcopy(self._filter_data(defaults))
 
             if data is not None:
                 self._defaults_data = data
@@ -149,10 +284,14 @@ class Loader(object):
                 raise TypeError("defaults options must be string of path to file or dict or some package: %s", type(defaults))
 
     def _load(self, filepath, extra=None):
-        self._load_defaults()
+        stats = self._stats
+        with stats.phase("defaults"):
+            self._load_defaults()
 
-        filepath = self._resolve_filepath(filepath)
-        data = self._run_path(filepath)
+        with stats.phase("resolve"):
+            filepath = self._resolve_filepath(filepath)
+        with stats.phase("execute"):
+            data = self._run_path(filepath)
         self._extend_data(self._defaults_data)
         self._extend_data(data)
         
@@ -178,20 +317,31 @@ class Loader(object):
                 f.write(line)
             f.close()
             filepath = path.basename(f.name)
-        
-        try:
-            # handler root filepath
-            data = self._load(filepath, extra=extra)
-        finally:
-            if f:
-                os.remove(f.name)
 
-        # convert to result config data structure
-        conf = self.convert(data)
-        
+        stats = LoadStats() if self._collect_stats else NULL_STATS
+        self._stats = stats
+
+        self._dir_index.next_generation()
+        with stats.phase("total"):
+            try:
+                # handler root filepath
+                data = self._load(filepath, extra=extra)
+            finally:
+                if f:
+                    os.remove(f.name)
+
+            # convert to result config data structure
+            with stats.phase("convert"):
+                conf = self.convert(data)
+
         self.cleanup()
         return conf
 
+    def stats(self):
+        """LoadStats of last load, loader must be created with stats=True.
+        Files executed by parallel workers are not recorded."""
+        return self._stats
+
     def convert(self, data):
         return data
 
@@ -213,6 +363,8 @@ class ConfigLoader(Loader):
 
     def __init__(self, directory,
                  exts=None, builder=None, validator=None,
+                 persistent=False, workers=None, lazy=False,
+                 snapshot=None, branch_cache=None, provenance=False,
                  **kwargs):
         super(ConfigLoader, self).__init__(directory, exts=exts, **kwargs)
 
@@ -222,30 +374,52 @@ class ConfigLoader(Loader):
             raise TypeError("option builder must be istance of Builder")
         self._validator = validator
         self._builder = builder
+        self._persistent = persistent
+        self._workers = workers
+        self._pool = None
+        self._config_cls = LazyConfig if lazy else Config
+        self._snapshot = snapshot
+        self._branch_cache = branch_cache
+        self._provenance = provenance
+        self._origins = None
+        self._sources = []
+        self._absent = []
+        self._options_fingerprint = None
+        self._reload_filepath = None
+        self._replacement = ReplacementEngine()
         
         self._included = []
+        # probed paths of files which are executed now
+        self._probes_stack = []
+        # (resolved, requested) filepaths of their includes
+        self._requests_stack = []
         self._root_filepath = ":root:"
         self._defaults_filepath = ":defaults:"
         self._parent_filepath = self._root_filepath
         
         self._runpy_helpers = {}
+        self._helper_instances = {}
         self._create_runpy_helpers()
+        # executed files depend on helpers in their globals
+        self._helpers_key = tuple(sorted(
+            (n, type(hi)) for n, hi in self._helper_instances.iteritems()))
 
         # alpha TODO
         self._tree = None
-        self._tree_branches = {}
         self._tree_queue_branch = None
-        self._create_tree_root()
+        self._defaults_changed = False
+        self._reset_tree()
     
     def cleanup(self):
         super(ConfigLoader, self).cleanup()
 
         self._included = []
         self._parent_filepath = self._root_filepath
-
-        self._tree_branches = {}
         self._tree_queue_branch = None
-        self._create_tree_root()
+
+        # persistent loader keeps tree for incremental reload
+        if not self._persistent:
+            self._reset_tree()
 
         if self._validator:
             self._validator.cleanup()
@@ -261,6 +435,38 @@ class ConfigLoader(Loader):
         self._tree_branches[filepath] = ret
         return ret
     
+    def _reset_tree(self):
+        self._tree_branches = {}
+        self._tree_stats = {}
+        # filepath -> paths of absent files which would change resolving
+        # of its includes
+        self._tree_probes = {}
+        # filepath -> {key: (filepath, helper name)} of keys set by children
+        self._tree_origins = {} if self._provenance else None
+        self._tree_filepath = None
+        self._probed = set()
+        self._create_tree_root()
+
+    def _save_tree(self):
+        # reload changes branches in place, so their state is kept
+        # to return to the last good tree if reload fails
+        states = dict((fp, (list(b[1]), b[2], b[3]))
+                      for fp, b in self._tree_branches.iteritems())
+        origins = self._tree_origins
+        if origins is not None:
+            origins = dict(origins)
+        return (dict(self._tree_branches), states,
+                dict(self._tree_stats), dict(self._tree_probes), origins)
+
+    def _restore_tree(self, saved):
+        branches, states, tree_stats, tree_probes, origins = saved
+        for filepath, state in states.iteritems():
+            branches[filepath][1:] = state
+        self._tree_branches = branches
+        self._tree_stats = tree_stats
+        self._tree_probes = tree_probes
+        self._tree_origins = origins
+
     def _create_tree_root(self):
         self._tree = [self._get_tree_branch(self._root_filepath),
                       self._dummy_helper, [], {}]
@@ -275,14 +481,17 @@ class ConfigLoader(Loader):
     def parent_join(self, filepath):
         return path.join(path.dirname(self._parent_filepath), filepath)
 
-    def _get_runpy_helper_wrap(self, h):
+    def _get_runpy_helper_wrap(self, h, loader=None):
+        if loader is None:
+            loader = self
         def wrap(*args, **kwargs):
-            return h.caller(self, *args, **kwargs)
+            return h.caller(loader, *args, **kwargs)
         return wrap
 
     def _create_runpy_helpers(self):
         for n, h in self._helpers.iteritems():
             hi = h()
+            self._helper_instances[n] = hi
             self._runpy_helpers[n] = self._get_runpy_helper_wrap(hi)
 
     def _handle(self, filepath, helper=None,
@@ -313,32 +522,259 @@ class ConfigLoader(Loader):
         queue_branch[0][1].append(queue_data)
 
         if branch[2] is None:
-            # append filepath for check cycling include
-            _included.append(filepath)
+            self._execute_branch(queue_data)
+
+    def _execute_branch(self, queue_data):
+        branch = queue_data[0]
+        filepath = branch[0]
+        _included = self._included
+
+        if self._persistent:
+            self._tree_stats[filepath] = self._stat_filepath(filepath)
+
+        # append filepath for check cycling include
+        _included.append(filepath)
 
-            # safe previously parent_filepath
-            prev_parent_filepath = self._parent_filepath
-            self._parent_filepath = filepath
+        # safe previously parent_filepath
+        prev_parent_filepath = self._parent_filepath
+        self._parent_filepath = filepath
 
-            prev_queue_branch = self._tree_queue_branch
-            self._tree_queue_branch = queue_data
+        prev_queue_branch = self._tree_queue_branch
+        self._tree_queue_branch = queue_data
 
+        branch_cache = self._branch_cache
+        cached = None
+        if branch_cache is not None:
+            cache_key = (self.directory, filepath, self._exts,
+                         self._helpers_key)
+            fingerprint = branch_cache.fingerprint(self.joinpath(filepath))
+            if fingerprint is not None:
+                cached = branch_cache.get(cache_key, fingerprint)
+            # included names are resolved the same while files with
+            # extensions of higher priority are absent
+            if cached is not None and (
+                    any(self._dir_index.exists(p) for p in cached[2]) or
+                    not self._can_replay(cached[1])):
+                cached = None
+
+        probes = []
+        requests = []
+        self._probes_stack.append(probes)
+        self._requests_stack.append(requests)
+        if cached is not None:
+            # replay helpers calls of file instead of execution
+            data, calls, probed = cached
+            for requested, resolved, name, args, kwargs in calls:
+                helper = self._helper_instances.get(name, self._dummy_helper)
+                self.handle(requested, helper, args, kwargs)
+        else:
             # eval python file with helpers
             data = self._run_path(filepath, self._runpy_helpers)
-            
-            # return previously parent_filepath
-            self._parent_filepath = prev_parent_filepath
-            self._tree_queue_branch = prev_queue_branch
+        self._probes_stack.pop()
+        self._requests_stack.pop()
+        if self._persistent:
+            self._tree_probes[filepath] = probes
 
-            # remove filepath in circular check
-            _included.remove(filepath)
-            
-            # add data
-            branch[2] = data
+        # return previously parent_filepath
+        self._parent_filepath = prev_parent_filepath
+        self._tree_queue_branch = prev_queue_branch
+
+        # remove filepath in circular check
+        _included.remove(filepath)
+
+        # add data
+        branch[2] = data
+
+        if cached is None and branch_cache is not None and fingerprint is not None:
+            calls = []
+            for c in branch[1]:
+                resolved = c[0][0]
+                requested = resolved
+                for i, request in enumerate(requests):
+                    if request[0] == resolved:
+                        requested = request[1]
+                        del requests[i]
+                        break
+                calls.append((requested, resolved, c[1].NAME, c[2], c[3]))
+            branch_cache.put(cache_key, fingerprint, data, calls, probes)
+
+    def _can_replay(self, calls):
+        # included names must be resolved to the same files, otherwise
+        # file is executed and its includes fail as usual
+        for requested, resolved, name, args, kwargs in calls:
+            try:
+                if self._resolve_filepath(requested) != resolved:
+                    return False
+            except (AbsPathError, NotFoundError, NotFoundExtsError,
+                    UndeclaredExtError):
+                return False
+        return True
+
+    def _run_recorded_branch(self, filepath):
+        recorder = _IncludeRecorder(filepath)
+        helpers = {}
+        for n, hi in self._helper_instances.iteritems():
+            helpers[n] = self._get_runpy_helper_wrap(hi, loader=recorder)
+        data = self._run_path(filepath, helpers)
+        return data, recorder.calls
+
+    def _get_pool(self):
+        # workers are forked once and serve all loads of loader
+        pool = self._pool
+        if pool is None:
+            pool = self._pool = Pool(self._workers, _init_parallel_worker,
+                                     (self,))
+        return pool
+
+    def close(self):
+        """Stop worker processes of parallel loader"""
+        pool = self._pool
+        if pool is not None:
+            self._pool = None
+            pool.terminate()
+            pool.join()
+
+    def _handle_parallel(self, filepath):
+        branch = self._get_tree_branch(filepath)
+        self._tree[0][1].append([branch, self._dummy_helper, [], {}])
+
+        # included files are executed after including file, so their
+        # errors are raised by load and can't be caught in including file
+        pool = self._get_pool()
+        scheduled = set([filepath])
+        pending = [branch]
+        while pending:
+            results = []
+            for b in pending:
+                if self._persistent:
+                    self._tree_stats[b[0]] = self._stat_filepath(b[0])
+                results.append((b, pool.apply_async(_run_parallel_branch,
+                                                    (b[0],))))
+            pending = []
+
+            # replay helpers calls in declaration order
+            for b, result in results:
+                data, calls = result.get()
+                b[2] = data
+                for child_filepath, name, args, kwargs in calls:
+                    resolved = self._resolve_filepath(child_filepath)
+                    self._probed.update(self._probed_filepaths(child_filepath,
+                                                               resolved))
+                    child_filepath = resolved
+                    child = self._get_tree_branch(child_filepath)
+                    helper = self._helper_instances.get(name,
+                                                        self._dummy_helper)
+                    b[1].append([child, helper, args or [], kwargs or {}])
+                    if child_filepath not in scheduled:
+                        scheduled.add(child_filepath)
+                        pending.append(child)
+
+        self._check_circular(self._tree, [], set())
+
+    def _check_circular(self, queue_data, included, checked):
+        filepath = queue_data[0][0]
+        if filepath in included:
+            raise CircularIncludeError("%s already included: %s" % (filepath, "->".join(included)))
+        if filepath in checked:
+            return
+
+        is_marker = self._is_tree_marker(filepath)
+        if not is_marker:
+            included.append(filepath)
+        for child in queue_data[0][1]:
+            self._check_circular(child, included, checked)
+        if not is_marker:
+            included.pop()
+        checked.add(filepath)
+
+    def _stat_filepath(self, filepath):
+        try:
+            st = os.stat(self.joinpath(filepath))
+        except OSError:
+            return None
+        return (st.st_mtime, st.st_size)
+
+    def _is_tree_marker(self, filepath):
+        return filepath in (self._root_filepath, self._defaults_filepath)
+
+    def _refresh_tree(self):
+        # drop data of changed files, they will be executed again.
+        # File is changed also if its include is resolved to new file
+        tree_stats = self._tree_stats
+        tree_probes = self._tree_probes
+        exists = self._dir_index.exists
+        for filepath, stat in tree_stats.items():
+            if (self._stat_filepath(filepath) != stat or
+                    any(exists(p) for p in tree_probes.get(filepath, ()))):
+                branch = self._tree_branches[filepath]
+                branch[1] = []
+                branch[2] = None
+                branch[3] = None
+                del tree_stats[filepath]
+                tree_probes.pop(filepath, None)
+                if self._tree_origins is not None:
+                    self._tree_origins.pop(filepath, None)
+
+        dirty = set()
+        if self._defaults_changed:
+            dirty.add(self._defaults_filepath)
+        visited = set()
+        self._refresh_branch(self._tree, [], set(tree_stats), dirty, visited)
+
+        # forget files which are not included anymore
+        for filepath in self._tree_branches.keys():
+            if filepath not in visited:
+                del self._tree_branches[filepath]
+                tree_stats.pop(filepath, None)
+                tree_probes.pop(filepath, None)
+                if self._tree_origins is not None:
+                    self._tree_origins.pop(filepath, None)
+        return dirty
+
+    def _refresh_branch(self, queue_data, included, known, dirty, visited):
+        branch = queue_data[0]
+        filepath = branch[0]
+        if filepath in visited:
+            return filepath in dirty
+        visited.add(filepath)
+
+        if not self._is_tree_marker(filepath):
+            if branch[2] is None:
+                self._included = list(included)
+                self._execute_branch(queue_data)
+            if filepath not in known:
+                dirty.add(filepath)
+            included = included + [filepath]
+
+        for child in branch[1]:
+            if self._refresh_branch(child, included, known, dirty, visited):
+                dirty.add(filepath)
+        return filepath in dirty
+
+    def _missing_filepaths(self, filepath):
+        # files which would be found by name which is not found now
+        filepath = path.normpath(filepath)
+        if path.isabs(filepath):
+            filepath = filepath[1:]
+        name = path.join(path.abspath(self.directory), filepath)
+        if path.splitext(filepath)[1]:
+            return [name]
+        return ["%s.%s" % (name, e) for e in self._exts]
 
     def handle(self, filepath, *args, **kwargs):
-        filepath = self._resolve_filepath(filepath)
-        return self._handle(filepath, *args, **kwargs)
+        try:
+            resolved = self._resolve_filepath(filepath)
+        except (NotFoundError, NotFoundExtsError):
+            self._probed.update(self._missing_filepaths(filepath))
+            raise
+        probed = self._probed_filepaths(filepath, resolved)
+        if probed:
+            self._probed.update(probed)
+            if self._probes_stack:
+                self._probes_stack[-1].extend(probed)
+        if self._requests_stack:
+            self._requests_stack[-1].append((resolved, filepath))
+        return self._handle(resolved, *args, **kwargs)
     
     def _iter_tree(self, _iner=None):
         branch = _iner or self._tree
@@ -347,66 +783,317 @@ class ConfigLoader(Loader):
                 yield bi
             yield branch, b
 
-    def _collect_result_data(self):
-        data = {}
-        for p, c in self._iter_tree():
-            pdata = p[0][3]
-            if pdata is None:
-                pdata = p[0][2]
+    def _collect_result_data(self, dirty=None):
+        root = self._tree[0]
+        self._collect_branch_data(root, dirty, set())
+        data = root[3]
+        if data is None:
+            data = {}
+        # merged data of branches may be kept for reload, so work on copy
+        self._data = data.copy()
+
+    def _collect_branch_data(self, branch, dirty, done):
+        filepath = branch[0]
+        if filepath in done:
+            return
+        done.add(filepath)
+        if dirty is not None and filepath not in dirty:
+            return
+
+        children = branch[1]
+        data = branch[2]
+        stats = self._stats
+        tree_origins = self._tree_origins
+        if tree_origins is not None:
+            origins = {}
+        for c in children:
+            self._collect_branch_data(c[0], dirty, done)
 
             cdata = c[0][3]
             if cdata is None:
                 cdata = c[0][2]
                 if cdata is None:
                     cdata = {}
-            if not pdata:
+            if tree_origins is not None:
+                self._merge_origins(origins, c, data, cdata)
+            if not data:
                 data = cdata.copy()
+            elif stats.enabled:
+                start = time.time()
+                data = c[1].merge(data, cdata, *c[2], **c[3])
+                stats.add_edge(filepath, c[0][0], c[1].NAME,
+                               time.time() - start)
             else:
-                data = c[1].merge(pdata, cdata, *c[2], **c[3])
-            p[0][3] = data
-        self._data = data
+                data = c[1].merge(data, cdata, *c[2], **c[3])
+        if children:
+            branch[3] = data
+        if tree_origins is not None:
+            # file without children has no keys set by other files
+            if children:
+                tree_origins[filepath] = origins
+            else:
+                tree_origins.pop(filepath, None)
+
+    def _merge_origins(self, origins, queue_data, data, cdata):
+        child_filepath = queue_data[0][0]
+        helper = queue_data[1]
+        if not data:
+            keys = cdata.keys()
+        else:
+            keys = helper.merged_keys(data, cdata,
+                                      *queue_data[2], **queue_data[3])
+        # own keys of child have no origin yet,
+        # helper of origin is the helper which included file
+        child_origins = self._tree_origins.get(child_filepath) or {}
+        for k in keys:
+            origin = child_origins.get(k)
+            if origin is None:
+                origin = (child_filepath, helper.NAME)
+            origins[k] = origin
+
+    def _collect_origins(self, data, extra):
+        origins = {}
+        root_origins = self._tree_origins.get(self._root_filepath) or {}
+        for k in data:
+            if extra and k in extra:
+                origins[k] = (":extra:", None)
+                continue
+            try:
+                filepath, helper = root_origins[k]
+            except KeyError:
+                continue
+            if filepath == self._defaults_filepath:
+                filepath = self._defaults_fullpath or filepath
+            else:
+                filepath = self.joinpath(filepath)
+            origins[k] = (filepath, helper)
+        return origins
     
     def _load_defaults(self):
         super(ConfigLoader, self)._load_defaults()
 
+        data = self._defaults_data
         branch = self._get_tree_branch(self._defaults_filepath)
-        branch[2] = self._defaults_data
-        self._tree[0][1].insert(0, [branch, self._dummy_helper, [], {}])
+        self._defaults_changed = (branch[2] is not data and
+                                  branch[2] != data)
+        branch[2] = data
 
-    def _load(self, filepath, extra=None):
-        self._load_defaults()
+        root_children = self._tree[0][1]
+        if not root_children or root_children[0][0] is not branch:
+            root_children.insert(0, [branch, self._dummy_helper, [], {}])
 
+    def _load(self, filepath, extra=None):
         validator = self._validator
         builder = self._builder
-         
-        filepath = self._resolve_filepath(filepath)
-        self._handle(filepath)
-        
-        self._collect_result_data()
-        
-        if extra:
-            self._extend_data(extra)
+        stats = self._stats
 
-        data = self._data
-        
-        replacement = data.pop("EXEC_REPLACEMENT", None)
-        if replacement is not None:
-            data = recursive_fmt(data, replacement)
+        with stats.phase("resolve"):
+            try:
+                resolved = self._resolve_filepath(filepath)
+            except (NotFoundError, NotFoundExtsError):
+                self._absent = sorted(set(self._absent) |
+                                      set(self._missing_filepaths(filepath)))
+                raise
+        self._reload_filepath = resolved
+        incremental = (self._persistent and
+                       self._tree_filepath == resolved)
+        if incremental:
+            saved_tree = self._save_tree()
+        elif self._tree_filepath is not None:
+            self._reset_tree()
+        self._probed.update(self._probed_filepaths(filepath, resolved))
+        filepath = resolved
 
-        if builder:
-            data = builder.build(data)
-        
-        if validator:
-            data = validator.validate(data)
+        try:
+            with stats.phase("defaults"):
+                self._load_defaults()
+            with stats.phase("execute"):
+                if incremental:
+                    dirty = self._refresh_tree()
+                else:
+                    dirty = None
+                    self._tree_filepath = filepath
+                    if self._workers is not None and self._workers > 1:
+                        self._handle_parallel(filepath)
+                    else:
+                        self._handle(filepath)
+            with stats.phase("collect"):
+                self._collect_result_data(dirty)
+            self._sources = self._source_filepaths()
+            self._absent = sorted(self._probed)
+
+            if extra:
+                self._extend_data(extra)
+
+            data = self._data
+
+            replacement = data.pop("EXEC_REPLACEMENT", None)
+            if replacement is not None:
+                if self._persistent:
+                    engine = self._replacement
+                else:
+                    # nothing to reuse, so don't keep data after load
+                    engine = ReplacementEngine()
+                with stats.phase("replacement"):
+                    data = engine.render(data, replacement)
+
+            if builder:
+                with stats.phase("builder"):
+                    if type(builder).build.im_func is not Builder.build.im_func:
+                        # merged data shares subtrees with files data, defaults
+                        # and caches, builder gets its own copy to change
+                        data = copy.deepcopy(data)
+                    data = builder.build(data)
+
+            if validator:
+                with stats.phase("validator"):
+                    data = validator.validate(data)
+        except:
+            # files which failed load tried to execute are sources too,
+            # so watchers see when they are fixed
+            self._sources = sorted(set(self._sources) |
+                                   set(self._source_filepaths()))
+            # and files which it didn't find
+            self._absent = sorted(set(self._absent) | self._probed)
+            # do not leave half built tree for next load
+            self._included = []
+            self._probes_stack = []
+            self._requests_stack = []
+            self._parent_filepath = self._root_filepath
+            self._tree_queue_branch = None
+            if incremental:
+                # changed files are executed again by next reload
+                self._restore_tree(saved_tree)
+            else:
+                self._reset_tree()
+            raise
+
+        if self._provenance:
+            self._origins = self._collect_origins(data, extra)
 
         self._data = data
         return data
 
+    def _source_filepaths(self):
+        ret = []
+        if self._defaults_fullpath is not None:
+            ret.append(self._defaults_fullpath)
+        for filepath in self._tree_branches:
+            if not self._is_tree_marker(filepath):
+                ret.append(self.joinpath(filepath))
+        return ret
+
+    def sources(self):
+        """Full paths of files executed by last load, after failed load
+        also files which it tried to execute"""
+        return list(self._sources)
+
+    def absent(self):
+        """Full paths of files which were looked for by last load and
+        not found, creating any of them may change loaded config"""
+        return list(self._absent)
+
+    def manifest(self):
+        return build_manifest(self._sources, absent=self._absent)
+
+    def _get_options_fingerprint(self):
+        # loaded data depends on these options besides source files
+        fingerprint = self._options_fingerprint
+        if fingerprint is None:
+            defaults = self._defaults
+            if defaults is not None and not isinstance(defaults, basestring):
+                if isinstance(defaults, ModuleType):
+                    defaults = vars(defaults)
+                defaults = sorted(self._filter_data(defaults).iteritems())
+            options = (self.directory, self._exts, defaults,
+                       self._validator, self._builder, self._helpers_key)
+            try:
+                raw = pickle.dumps(options, 2)
+            except (pickle.PicklingError, TypeError, AttributeError):
+                # options can't be compared, snapshot is never used
+                fingerprint = False
+            else:
+                fingerprint = hashlib.sha1(raw).hexdigest()
+            self._options_fingerprint = fingerprint
+        return fingerprint
+
+    def snapshot_key(self, filepath, extra=None):
+        """Key of snapshot of load, snapshot is used only by load with
+        equal key. None if options of loader can't be compared"""
+        fingerprint = self._get_options_fingerprint()
+        if fingerprint is False:
+            return None
+        return [filepath, extra or {}, fingerprint]
+
+    def load(self, filepath, extra=None):
+        snapshot = self._snapshot
+        key = None
+        if snapshot is not None and isinstance(filepath, basestring):
+            key = self.snapshot_key(filepath, extra)
+        if key is None:
+            return super(ConfigLoader, self).load(filepath, extra=extra)
+
+        start = time.time()
+        try:
+            data, manifest, snapshot_key, origins = read_snapshot(snapshot)
+        except (IOError, SnapshotError):
+            pass
+        else:
+            # snapshot of loader without provenance has no origins
+            if (snapshot_key == key and
+                    (origins is not None or not self._provenance) and
+                    check_manifest(manifest)):
+                self._reload_filepath = filepath
+                self._sources = [m[0] for m in manifest if m[3] is not False]
+                self._absent = [m[0] for m in manifest if m[3] is False]
+                conf = self._config_cls(data)
+                if self._provenance:
+                    self._origins = origins
+                    conf._set_origins(origins)
+                self._stats = LoadStats() if self._collect_stats else NULL_STATS
+                self._stats.add_phase("snapshot", time.time() - start)
+                return conf
+        read_time = time.time() - start
+
+        conf = super(ConfigLoader, self).load(filepath, extra=extra)
+        stats = self._stats
+        stats.add_phase("snapshot", read_time)
+        with stats.phase("snapshot"):
+            try:
+                write_snapshot(snapshot, conf._to_snapshot(manifest=self.manifest(),
+                                                           key=key))
+            except (IOError, OSError, SnapshotError):
+                # snapshot only speeds up next load, loaded config is good
+                pass
+        return conf
+
+    def reload(self, extra=None):
+        if not self._persistent:
+            raise RuntimeError("reload available only for persistent loader")
+        if self._reload_filepath is None:
+            raise RuntimeError("nothing to reload, load some file first")
+        return self.load(self._reload_filepath, extra=extra)
+
+    def origins(self):
+        """Origins of keys of last load as {key: (fullpath, helper name)},
+        loader must be created with provenance=True"""
+        return self._origins
+
     def convert(self, data):
-        return Config(data)
+        conf = self._config_cls(data)
+        if self._provenance:
+            conf._set_origins(self._origins)
+        return conf
 
 
 class ValidatorLoader(Loader):
+    def __init__(self, directory, exts=None, compiled=False,
+                 incremental=False, **kwargs):
+        super(ValidatorLoader, self).__init__(directory, exts=exts, **kwargs)
+
+        self._compiled = compiled
+        self._incremental = incremental
+
     def _load(self, filepath, extra=None):
         filepath = self._resolve_filepath(filepath)
         data = self._run_path(filepath, LOADER_GLOBALS)
@@ -430,10 +1117,78 @@ class ValidatorLoader(Loader):
         else:
             AVT = Dict(data)
 
-        validator = Validator(AVT, only_declared=only_declared)
+        validator = Validator(AVT, only_declared=only_declared,
+                              compiled=self._compiled,
+                              incremental=self._incremental)
         return validator
 
 
+class AsyncConfigLoader(object):
+    """Runs loads of wrapped loader in executor and returns AsyncResult.
+
+    Executor is object with apply_async method which runs functions in
+    threads of this process like ThreadPool, by default single thread
+    pool. Process pools can't be used, loader is not sent to other
+    processes. Loads of wrapped loader never run concurrently and requests
+    equal to the load in flight share its result."""
+
+    def __init__(self, loader, executor=None):
+        # only executor created here is closed by close()
+        self._own_executor = executor is None
+        if executor is None:
+            executor = ThreadPool(1)
+        elif isinstance(executor, Pool) and not isinstance(executor, ThreadPool):
+            raise TypeError("executor must run loads in threads, process pool is given")
+        self._loader = loader
+        self._executor = executor
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._inflight = {}
+
+    @property
+    def loader(self):
+        return self._loader
+
+    def _run(self, key, method, args, kwargs):
+        try:
+            with self._load_lock:
+                return getattr(self._loader, method)(*args, **kwargs)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def _submit(self, key, method, args, kwargs):
+        # lock is held until result is stored, so _run removes it after
+        with self._lock:
+            try:
+                return self._inflight[key]
+            except KeyError:
+                pass
+            result = self._executor.apply_async(self._run,
+                                                (key, method, args, kwargs))
+            self._inflight[key] = result
+            return result
+
+    def load(self, filepath, extra=None):
+        if isinstance(filepath, basestring):
+            key = ("load", filepath, make_hashable(extra or {}))
+        else:
+            # file objects are never shared
+            key = ("load", id(filepath), object())
+        return self._submit(key, "load", (filepath,), {"extra": extra})
+
+    def reload(self, extra=None):
+        key = ("reload", make_hashable(extra or {}))
+        return self._submit(key, "reload", (), {"extra": extra})
+
+    def close(self):
+        """Stop default executor, executor given by caller is left
+        running"""
+        if self._own_executor:
+            self._executor.close()
+            self._executor.join()
+
+
 # Built-in helpers
 ConfigLoader.add_helper(IncludeHelper)
 ConfigLoader.add_helper(MergeHelper)
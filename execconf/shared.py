@@ -0,0 +1,266 @@
+from __future__ import absolute_import
+import mmap
+import struct
+from collections import Mapping
+try:
+    import simplejson as json
+except ImportError:
+    import json
+from .snapshot import write_snapshot
+from .exceptions import SnapshotError
+from .utils import _hash_items
+
+__all__ = ["SharedConfig", "dump_shared"]
+
+SHARED_MAGIC = "EXCM\x01\x00\x00\x00"
+
+# every value is tag byte and payload. Containers store offsets of items,
+# so any value is decoded without reading the rest of buffer
+_TAG_NONE = "N"
+_TAG_TRUE = "T"
+_TAG_FALSE = "F"
+_TAG_INT = "i"
+_TAG_LONG = "L"
+_TAG_FLOAT = "f"
+_TAG_STR = "s"
+_TAG_UNICODE = "u"
+_TAG_DICT = "d"
+_TAG_TUPLE = "a"
+_TAG_FROZENSET = "S"
+
+_OFFSET = struct.Struct("<Q")
+_SIZE = struct.Struct("<I")
+_INT = struct.Struct("<q")
+_FLOAT = struct.Struct("<d")
+_INT_MIN = -(1 << 63)
+_INT_MAX = (1 << 63) - 1
+
+
+class _Encoder(object):
+    def __init__(self):
+        self._buf = bytearray(SHARED_MAGIC)
+        self._buf.extend(_OFFSET.pack(0))
+        # same strings are stored once
+        self._strings = {}
+
+    def _write(self, tag, payload=""):
+        offset = len(self._buf)
+        self._buf.extend(tag)
+        self._buf.extend(payload)
+        return offset
+
+    def _write_offsets(self, tag, offsets):
+        payload = [_SIZE.pack(len(offsets))]
+        payload.extend(_OFFSET.pack(o) for o in offsets)
+        return self._write(tag, "".join(payload))
+
+    def encode(self, value):
+        if value is None:
+            return self._write(_TAG_NONE)
+        if value is True:
+            return self._write(_TAG_TRUE)
+        if value is False:
+            return self._write(_TAG_FALSE)
+        if isinstance(value, basestring):
+            key = (type(value), value)
+            try:
+                return self._strings[key]
+            except KeyError:
+                pass
+            if isinstance(value, unicode):
+                raw = value.encode("utf-8")
+                tag = _TAG_UNICODE
+            else:
+                raw = str(value)
+                tag = _TAG_STR
+            offset = self._strings[key] = self._write(tag, _SIZE.pack(len(raw)) + raw)
+            return offset
+        if isinstance(value, (int, long)):
+            if _INT_MIN <= value <= _INT_MAX:
+                return self._write(_TAG_INT, _INT.pack(value))
+            raw = str(value)
+            return self._write(_TAG_LONG, _SIZE.pack(len(raw)) + raw)
+        if isinstance(value, float):
+            return self._write(_TAG_FLOAT, _FLOAT.pack(value))
+        if isinstance(value, dict):
+            offsets = []
+            for k, v in value.iteritems():
+                offsets.append(self.encode(k))
+                offsets.append(self.encode(v))
+            return self._write_offsets(_TAG_DICT, offsets)
+        if isinstance(value, (list, tuple)):
+            return self._write_offsets(_TAG_TUPLE,
+                                       [self.encode(v) for v in value])
+        if isinstance(value, (set, frozenset)):
+            return self._write_offsets(_TAG_FROZENSET,
+                                       [self.encode(v) for v in value])
+        raise SnapshotError("value %r of %s can't be stored in shared config" % (value, type(value)))
+
+    def dumps(self, data):
+        root = self.encode(data)
+        _OFFSET.pack_into(self._buf, len(SHARED_MAGIC), root)
+        return str(self._buf)
+
+
+def dump_shared(data, filepath):
+    write_snapshot(filepath, _Encoder().dumps(data))
+
+
+class _Decoder(object):
+    def __init__(self, buf):
+        if buf[:len(SHARED_MAGIC)] != SHARED_MAGIC:
+            raise SnapshotError("unknown shared config format")
+        self._buf = buf
+
+    def root(self):
+        return self.decode(_OFFSET.unpack_from(self._buf, len(SHARED_MAGIC))[0])
+
+    def offsets(self, offset):
+        count = _SIZE.unpack_from(self._buf, offset + 1)[0]
+        start = offset + 1 + _SIZE.size
+        return struct.unpack_from("<%iQ" % count, self._buf, start)
+
+    def size(self, offset):
+        return _SIZE.unpack_from(self._buf, offset + 1)[0]
+
+    def decode(self, offset):
+        buf = self._buf
+        tag = buf[offset]
+        if tag == _TAG_DICT:
+            return SharedConfig(self, offset)
+        if tag == _TAG_TUPLE:
+            return tuple(self.decode(o) for o in self.offsets(offset))
+        if tag in (_TAG_STR, _TAG_UNICODE, _TAG_LONG):
+            start = offset + 1 + _SIZE.size
+            raw = buf[start:start + self.size(offset)]
+            if tag == _TAG_UNICODE:
+                return raw.decode("utf-8")
+            if tag == _TAG_LONG:
+                return long(raw)
+            return raw
+        if tag == _TAG_INT:
+            return _INT.unpack_from(buf, offset + 1)[0]
+        if tag == _TAG_FLOAT:
+            return _FLOAT.unpack_from(buf, offset + 1)[0]
+        if tag == _TAG_NONE:
+            return None
+        if tag == _TAG_TRUE:
+            return True
+        if tag == _TAG_FALSE:
+            return False
+        if tag == _TAG_FROZENSET:
+            return frozenset(self.decode(o) for o in self.offsets(offset))
+        raise SnapshotError("unknown tag %r at %i" % (tag, offset))
+
+
+# attributes of SharedConfig which items don't hide
+_STATE_ATTRS = frozenset(["_decoder", "_offset", "_index", "_views"])
+
+
+class SharedConfig(Mapping):
+    """Read-only Config facade over shared buffer. Values are decoded on
+    access, so processes attached to one mmap'ed file share its pages."""
+
+    def __init__(self, decoder, offset):
+        object.__setattr__(self, "_decoder", decoder)
+        object.__setattr__(self, "_offset", offset)
+        object.__setattr__(self, "_index", None)
+        object.__setattr__(self, "_views", {})
+
+    @classmethod
+    def attach(cls, filepath):
+        with open(filepath, "rb") as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return _Decoder(buf).root()
+
+    @classmethod
+    def from_string(cls, raw):
+        return _Decoder(raw).root()
+
+    def _get_index(self):
+        index = self._index
+        if index is None:
+            decoder = self._decoder
+            offsets = decoder.offsets(self._offset)
+            index = {}
+            for i in xrange(0, len(offsets), 2):
+                index[decoder.decode(offsets[i])] = offsets[i + 1]
+            object.__setattr__(self, "_index", index)
+        return index
+
+    def __getitem__(self, k):
+        offset = self._get_index()[k]
+        try:
+            return self._views[offset]
+        except KeyError:
+            pass
+        value = self._decoder.decode(offset)
+        if isinstance(value, (SharedConfig, tuple)):
+            # keep nested views with their key indexes
+            self._views[offset] = value
+        return value
+
+    def __iter__(self):
+        return iter(self._get_index())
+
+    def __len__(self):
+        return self._decoder.size(self._offset) // 2
+
+    def __contains__(self, k):
+        return k in self._get_index()
+
+    def __getattribute__(self, k):
+        # the same lookup order as Config with items in __dict__ has:
+        # data descriptors of class, items, then other attributes.
+        # Own state is never hidden by items
+        if k not in _STATE_ATTRS and k in SharedConfig._get_index(self):
+            attr = getattr(type(self), k, None)
+            if attr is None or not hasattr(attr, "__set__"):
+                return SharedConfig.__getitem__(self, k)
+        return object.__getattribute__(self, k)
+
+    def __eq__(self, other):
+        if not isinstance(other, Mapping):
+            return NotImplemented
+        if len(self) != len(other):
+            return False
+        # items may hide methods
+        for k, v in SharedConfig.iteritems(self):
+            if k not in other or v != other[k]:
+                return False
+        return True
+
+    def __ne__(self, other):
+        eq = self.__eq__(other)
+        if eq is NotImplemented:
+            return eq
+        return not eq
+
+    def __hash__(self):
+        # equal to hash of Config with the same items
+        return _hash_items(self, SharedConfig.iteritems(self))
+
+    def __setattr__(self, k, v):
+        raise AttributeError("Config cannot be modified.")
+
+    def __delattr__(self, k):
+        raise AttributeError("Config cannot be modified.")
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, dict(SharedConfig.iteritems(self)))
+
+    def _to_dict(self):
+        def convert(value):
+            if isinstance(value, SharedConfig):
+                return dict((k, convert(v)) for k, v in SharedConfig.iteritems(value))
+            if isinstance(value, tuple):
+                return tuple(convert(v) for v in value)
+            return value
+        return convert(self)
+
+    def _to_json(self, pretty_print=True):
+        kw = {}
+        if pretty_print:
+            kw["indent"] = 4
+            kw["sort_keys"] = True
+        return json.dumps(self._to_dict(), **kw)
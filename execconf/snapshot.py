@@ -0,0 +1,90 @@
+import os
+from os import path
+import marshal
+import hashlib
+import imp
+from tempfile import NamedTemporaryFile
+from .exceptions import SnapshotError
+
+__all__ = ["dump_snapshot", "load_snapshot", "read_snapshot",
+           "write_snapshot", "build_manifest", "check_manifest"]
+
+SNAPSHOT_MAGIC = "EXCS\x02" + imp.get_magic()
+
+def _file_digest(fullpath):
+    with open(fullpath, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def build_manifest(filepaths, absent=()):
+    '''list of (fullpath, mtime, size, sha1) of source files and
+    (fullpath, None, None, False) of files which must not exist'''
+    manifest = []
+    for fullpath in filepaths:
+        try:
+            st = os.stat(fullpath)
+            digest = _file_digest(fullpath)
+        except (IOError, OSError):
+            # never will be fresh
+            manifest.append((fullpath, None, None, None))
+        else:
+            manifest.append((fullpath, st.st_mtime, st.st_size, digest))
+    for fullpath in absent:
+        manifest.append((fullpath, None, None, False))
+    return manifest
+
+def check_manifest(manifest):
+    '''True if no one source file is changed or created'''
+    for fullpath, mtime, size, digest in manifest:
+        if digest is False:
+            if path.exists(fullpath):
+                return False
+            continue
+        if digest is None:
+            return False
+        try:
+            st = os.stat(fullpath)
+            if st.st_size != size:
+                return False
+            if st.st_mtime != mtime and _file_digest(fullpath) != digest:
+                return False
+        except (IOError, OSError):
+            return False
+    return True
+
+def dump_snapshot(data, manifest=None, key=None, origins=None):
+    try:
+        body = marshal.dumps((key, manifest or [], data, origins))
+    except ValueError, e:
+        raise SnapshotError("data can't be stored in snapshot: %s" % e)
+    return SNAPSHOT_MAGIC + body
+
+def load_snapshot(raw):
+    '''returns (data, manifest, key, origins)'''
+    if not raw.startswith(SNAPSHOT_MAGIC):
+        raise SnapshotError("unknown snapshot format or python version")
+    try:
+        key, manifest, data, origins = marshal.loads(buffer(raw, len(SNAPSHOT_MAGIC)))
+    except (ValueError, EOFError, TypeError), e:
+        raise SnapshotError("broken snapshot: %s" % e)
+    return data, manifest, key, origins
+
+def read_snapshot(filepath):
+    with open(filepath, "rb") as f:
+        raw = f.read()
+    return load_snapshot(raw)
+
+def write_snapshot(filepath, raw):
+    # readers never see half written snapshot
+    f = NamedTemporaryFile(mode="wb",
+                           prefix="excc_",
+                           dir=path.dirname(path.abspath(filepath)),
+                           delete=False)
+    try:
+        f.write(raw)
+        f.close()
+        os.rename(f.name, filepath)
+    except:
+        f.close()
+        if path.exists(f.name):
+            os.remove(f.name)
+        raise
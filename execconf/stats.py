@@ -0,0 +1,118 @@
+import time
+from contextlib import contextmanager
+from collections import OrderedDict
+
+__all__ = ["LoadStats"]
+
+
+class LoadStats(object):
+    '''Timings of one load. Phases are recorded in order of execution,
+    files with time of own execution without included files and size,
+    tree edges with merge time. All times are in seconds.'''
+
+    enabled = True
+
+    def __init__(self):
+        self.phases = OrderedDict()
+        self.files = OrderedDict()
+        self.edges = []
+        self._nested = []
+
+    @contextmanager
+    def phase(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.time() - start)
+
+    def add_phase(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def start_file(self):
+        self._nested.append(0.0)
+        return time.time()
+
+    def end_file(self, fullpath, start, size):
+        # included files are executed inside parent file, their time
+        # is not counted for parent
+        elapsed = time.time() - start
+        nested = self._nested.pop()
+        if self._nested:
+            self._nested[-1] += elapsed
+        self.files[fullpath] = (elapsed - nested, size)
+
+    def add_edge(self, parent, child, helper, seconds):
+        self.edges.append((parent, child, helper, seconds))
+
+    @property
+    def total(self):
+        return self.phases.get("total", sum(self.phases.itervalues()))
+
+    @property
+    def file_count(self):
+        return len(self.files)
+
+    @property
+    def bytes_read(self):
+        return sum(size for _, size in self.files.itervalues())
+
+    def slowest_files(self, count=None):
+        items = sorted(self.files.iteritems(),
+                       key=lambda item: item[1][0],
+                       reverse=True)
+        return items[:count] if count is not None else items
+
+    def _to_dict(self):
+        return {"total": self.total,
+                "phases": dict(self.phases),
+                "file_count": self.file_count,
+                "bytes_read": self.bytes_read,
+                "files": [{"filepath": fp, "exec": t, "size": size}
+                          for fp, (t, size) in self.files.iteritems()],
+                "edges": [{"parent": p, "child": c, "helper": h, "merge": t}
+                          for p, c, h, t in self.edges]}
+
+    def format(self, top=10):
+        lines = ["total: %.6f s, files: %i, bytes read: %i" % (
+            self.total, self.file_count, self.bytes_read)]
+        lines.append("phases:")
+        for name, seconds in self.phases.iteritems():
+            if name != "total":
+                lines.append("  %-12s %.6f" % (name, seconds))
+        if self.files:
+            lines.append("slowest files:")
+            for fp, (seconds, size) in self.slowest_files(top):
+                lines.append("  %.6f %8i %s" % (seconds, size, fp))
+        if self.edges:
+            lines.append("slowest merges:")
+            edges = sorted(self.edges, key=lambda e: e[3], reverse=True)
+            for parent, child, helper, seconds in edges[:top]:
+                lines.append("  %.6f %s <- %s (%s)" % (seconds, parent,
+                                                       child, helper))
+        return "\n".join(lines)
+
+
+class _NullStats(LoadStats):
+    '''Stats of loader without stats collection, records nothing'''
+
+    enabled = False
+
+    @contextmanager
+    def phase(self, name):
+        yield
+
+    def add_phase(self, name, seconds):
+        pass
+
+    def start_file(self):
+        return None
+
+    def end_file(self, fullpath, start, size):
+        pass
+
+    def add_edge(self, parent, child, helper, seconds):
+        pass
+
+
+NULL_STATS = _NullStats()
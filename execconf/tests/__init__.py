@@ -4,10 +4,17 @@ def all_tests_modules():
     modules = [
             "execconf.tests.test_utils",
             "execconf.tests.test_config",
+            "execconf.tests.test_snapshot",
+            "execconf.tests.test_shared",
             "execconf.tests.test_validator_nodes",
             "execconf.tests.test_validator",
+            "execconf.tests.test_validator_compiler",
             "execconf.tests.test_builder",
-            "execconf.tests.test_loader"
+            "execconf.tests.test_benchmarks",
+            "execconf.tests.test_loader",
+            "execconf.tests.test_batch",
+            "execconf.tests.test_extra",
+            "execconf.tests.test_watcher"
         ]
     return modules
 
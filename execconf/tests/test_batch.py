@@ -0,0 +1,96 @@
+import unittest
+import sys
+import os
+from os import path
+import json
+import shutil
+from tempfile import mkdtemp
+from execconf import ConfigLoader, cli_parser, cli_check, cli_namespace
+from execconf.batch import read_manifest, render_batch, BatchRenderer
+
+
+def write_file(filepath, content):
+    with open(filepath, "w") as f:
+        f.write(content)
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.directory = mkdtemp()
+        self.hosts = path.join(self.directory, "hosts")
+        os.mkdir(self.hosts)
+        write_file(path.join(self.hosts, "common.py"), "PORT = 80")
+        for i in xrange(4):
+            write_file(path.join(self.hosts, "host%i.py" % i),
+                       "include('common.py')\nNAME = 'host%i'" % i)
+        write_file(path.join(self.hosts, "broken.py"), "NAME = ")
+
+        jobs = [{"input": "hosts/host%i.py" % i,
+                 "output": "host%i.json" % i,
+                 "extra": {"ID": i}} for i in xrange(4)]
+        jobs.insert(2, {"input": "hosts/broken.py", "output": "broken.json"})
+        self.manifest = path.join(self.directory, "manifest.json")
+        write_file(self.manifest, json.dumps(jobs))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _check(self, processes):
+        jobs = read_manifest(self.manifest)
+        failed = render_batch(jobs, processes=processes)
+        self.assertEqual(len(failed), 1)
+        self.assertEqual(failed[0][0]["input"], path.join(self.hosts, "broken.py"))
+        self.assertTrue(failed[0][1].startswith("SyntaxError"))
+
+        for i in xrange(4):
+            with open(path.join(self.directory, "host%i.json" % i)) as f:
+                data = json.load(f)
+            self.assertEqual(data, {"PORT": 80, "NAME": "host%i" % i, "ID": i})
+
+    def test_render(self):
+        self._check(None)
+
+    def test_render_parallel(self):
+        self._check(2)
+
+    def test_loader_reuse(self):
+        renderer = BatchRenderer()
+        for job in read_manifest(self.manifest):
+            if "broken" not in job["input"]:
+                renderer.render(job)
+        self.assertTrue(renderer.loader(self.hosts) is renderer.loader(self.hosts + "/"))
+        self.assertEqual(len(renderer._loaders), 1)
+        # common.py is compiled once
+        self.assertEqual(len(renderer._code_cache), 5)
+
+    def test_cli(self):
+        parser = cli_parser()
+        extra_file = path.join(self.directory, "extra.env")
+        write_file(extra_file, "ENV = prod\nID = 10")
+        args = parser.parse_args(["--batch", self.manifest, "-e", "PORT", "81", "int",
+                                  "--extra-file", extra_file])
+        cli_check(parser, args)
+
+        devnull = open(os.devnull, "w")
+        stderr = sys.stderr
+        sys.stderr = devnull
+        try:
+            # broken.py fails
+            self.assertRaises(SystemExit, cli_namespace, args)
+            with open(path.join(self.directory, "host1.json")) as f:
+                data = json.load(f)
+            # extra of job overrides extra of command line
+            self.assertEqual(data, {"PORT": 81, "NAME": "host1", "ID": 1,
+                                    "ENV": "prod"})
+
+            for option in (["--stats"], ["--root-dir", self.directory],
+                           ["-o", "out.json"]):
+                args = parser.parse_args(["--batch", self.manifest] + option)
+                self.assertRaises(SystemExit, cli_check, parser, args)
+        finally:
+            sys.stderr = stderr
+            devnull.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+import os
+import shutil
+from tempfile import mkdtemp
+from execconf import ConfigLoader
+from execconf.benchmarks import (generate_tree, generate_validator,
+                                 run_benchmarks)
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_generate_tree(self):
+        directory = mkdtemp()
+        try:
+            root = generate_tree(directory, depth=3, fanout=2, keys=5,
+                                 mix=(0, 1, 0))
+            self.assertEqual(len(os.listdir(directory)), 7)
+            conf = ConfigLoader(directory).load(root)
+            self.assertEqual(len(conf), 5)
+            self.assertTrue(all(isinstance(v, int) for v in conf.values()))
+
+            data = conf._to_dict()
+            self.assertEqual(generate_validator(data).validate(data), data)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_run_benchmarks(self):
+        results = run_benchmarks(depth=2, fanout=2, keys=3, repeat=1)
+        self.assertEqual(results["files"], 3)
+        for phase in ("load", "merge", "validate", "config", "to_json"):
+            timing = results["phases"][phase]
+            self.assertTrue(timing["min"] <= timing["mean"] <= timing["max"])
+
+
+if __name__ == "__main__":
+    unittest.main()
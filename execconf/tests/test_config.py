@@ -1,9 +1,45 @@
 import unittest
-from execconf import Config
+import json
+from StringIO import StringIO
+try:
+    import yaml
+except ImportError:
+    yaml = None
+from execconf import Config, LazyConfig
 from execconf.utils import frozendict
 
 
 class TestConfig(unittest.TestCase):
+    def test_dump(self):
+        data = {"foo": "bar",
+                "list": [1, {"a": [True, None]}],
+                "dict": {"x": 1.5, "y": {}, "z": []},
+                u"unicode": u"\u0444"}
+        for conf in (Config(data), LazyConfig(data)):
+            for pretty_print in (True, False):
+                stream = StringIO()
+                conf._dump_json(stream, pretty_print=pretty_print)
+                self.assertEqual(stream.getvalue(),
+                                 conf._to_json(pretty_print=pretty_print))
+
+            if yaml:
+                for canonical in (True, False):
+                    stream = StringIO()
+                    conf._dump_yaml(stream, canonical=canonical)
+                    self.assertEqual(stream.getvalue(),
+                                     conf._to_yaml(canonical=canonical))
+            else:
+                self.assertRaises(NotImplementedError, conf._dump_yaml, StringIO())
+
+        if yaml:
+            # sets are kept as frozensets
+            for conf in (Config({"S": set([1, 2])}), LazyConfig({"S": set([1, 2])})):
+                stream = StringIO()
+                conf._dump_yaml(stream)
+                self.assertEqual(stream.getvalue(), conf._to_yaml())
+                self.assertEqual(yaml.safe_load(conf._to_yaml()),
+                                 {"S": set([1, 2])})
+
     def test_create(self):
         conf1 = Config({"foo": "bar"})
         conf2 = Config({"foo": ["bar"]})
@@ -52,4 +88,67 @@ class TestConfig(unittest.TestCase):
         self.assertEqual(cm.exception.message, "A Config cannot be modified.")
         self.assertEqual(conf2.foo["bar"], "baz")
 
+    def test_lazy(self):
+        data = {"foo": {"bar": "baz"}, "list": [{"bar": 1}, 2], "qux": 1}
+        conf1 = LazyConfig(data)
+        conf2 = Config(data)
+
+        self.assertTrue(isinstance(conf1, Config))
+        self.assertEqual(conf1.qux, 1)
+        self.assertEqual(len(conf1.__dict__), 0)
+        self.assertTrue(isinstance(dict.__getitem__(conf1, "foo"), dict))
+        self.assertTrue(isinstance(conf1.foo, LazyConfig))
+        self.assertTrue(conf1.foo is conf1["foo"])
+        self.assertEqual(conf1.foo.bar, "baz")
+        self.assertTrue(isinstance(conf1.get("list"), tuple))
+        self.assertTrue(isinstance(conf1.list[0], LazyConfig))
+        self.assertEqual(conf1.get("notfound", 2), 2)
+        self.assertEqual(conf1, conf2)
+        self.assertEqual(conf2, conf1)
+        self.assertNotEqual(conf1, LazyConfig(qux=2))
+        self.assertEqual(json.loads(conf1._to_json()), json.loads(conf2._to_json()))
+        self.assertEqual(conf1._to_dict(), conf2._to_dict())
+        # source data is not changed
+        self.assertTrue(isinstance(data["list"], list))
+
+        with self.assertRaises(AttributeError) as cm:
+            conf1.notfound
+        with self.assertRaises(AttributeError) as cm:
+            conf1.foo = "bar"
+        with self.assertRaises(AttributeError) as cm:
+            conf1["foo"]["bar"] = "qux"
+        self.assertEqual(conf1.foo.bar, "baz")
+
+        # dicts in tuples are converted as in lists
+        data = {"T": ({"a": 1}, [2])}
+        conf1 = LazyConfig(data)
+        self.assertTrue(isinstance(conf1.T[0], LazyConfig))
+        self.assertTrue(conf1.T is conf1.T)
+        self.assertTrue(conf1.T[1] is not data["T"][1])
+        self.assertEqual(conf1, Config(data))
+        with self.assertRaises(AttributeError) as cm:
+            conf1.T[0]["a"] = 2
+        self.assertEqual(data["T"][0], {"a": 1})
+
+        # items named like dict methods are looked up as in Config
+        data = {"keys": 1, "items": {"a": 1}, "get": [2], "update": 3}
+        conf1 = LazyConfig(data)
+        conf2 = Config(data)
+        for name in ("keys", "items", "get"):
+            self.assertEqual(getattr(conf1, name), getattr(conf2, name))
+        self.assertTrue(isinstance(conf1.items, LazyConfig))
+        self.assertEqual(conf1.keys, 1)
+        self.assertRaises(AttributeError, getattr, conf1, "update")
+        self.assertRaises(AttributeError, getattr, conf2, "update")
+        self.assertEqual(sorted(dict.keys(conf1)), sorted(data))
+        self.assertEqual(conf1, conf2)
+
+    def test_hash(self):
+        conf1 = Config({"foo": {"bar": "baz"}, "list": [1, {"foo": 1}]})
+        conf2 = Config({"list": [1, {"foo": 1}], "foo": {"bar": "baz"}})
+        conf3 = LazyConfig({"list": [1, {"foo": 1}], "foo": {"bar": "baz"}})
 
+        self.assertEqual(hash(conf1), hash(conf2))
+        self.assertEqual(hash(conf1), hash(conf3))
+        self.assertEqual(len(set([conf1, conf2, conf3])), 1)
+        self.assertTrue(conf1 in {conf3: True})
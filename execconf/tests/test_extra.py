@@ -0,0 +1,59 @@
+import unittest
+import os
+from os import path
+import shutil
+from tempfile import mkdtemp
+from StringIO import StringIO
+from execconf import Validator
+from execconf.validator.nodes import Dict, Integer, Boolean, List, String
+from execconf.extra import collect_extra, parse_env, parse_extra_file
+from execconf.exceptions import ValidatorConvertError
+
+
+class TestExtra(unittest.TestCase):
+    def test_parse(self):
+        environ = {"APP_PORT": "80", "APP_": "x", "OTHER": "1"}
+        self.assertEqual(parse_env("APP_", environ), {"PORT": "80"})
+
+        self.assertEqual(parse_extra_file(StringIO('{"A": [1, 2]}')),
+                         {"A": [1, 2]})
+        self.assertEqual(parse_extra_file(StringIO("# comment\nA = 1\n\nB=x=y\n")),
+                         {"A": "1", "B": "x=y"})
+        self.assertRaises(ValueError, parse_extra_file, StringIO("A"))
+
+    def test_collect(self):
+        directory = mkdtemp()
+        try:
+            filepath = path.join(directory, "extra.txt")
+            with open(filepath, "w") as f:
+                f.write("PORT=81\nHOSTS=[\"a\", \"b\"]\n")
+
+            validator = Validator(Dict({"PORT": Integer(),
+                                        "DEBUG": Boolean(),
+                                        "HOSTS": List([String()], loop=True)}))
+            environ = {"APP_PORT": "80", "APP_DEBUG": "yes", "APP_NAME": "app"}
+            data = collect_extra(env_prefix="APP_", filepaths=[filepath],
+                                 stream=StringIO('{"NAME": "svc"}'),
+                                 validator=validator, environ=environ)
+            self.assertEqual(data, {"PORT": 81, "DEBUG": True,
+                                    "HOSTS": [u"a", u"b"], "NAME": "svc"})
+
+            self.assertEqual(collect_extra(filepaths=[filepath]),
+                             {"PORT": "81", "HOSTS": '["a", "b"]'})
+
+            with self.assertRaisesRegexp(ValidatorConvertError, "extra option PORT"):
+                collect_extra(env_prefix="APP_", environ={"APP_PORT": "x"},
+                              validator=validator)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_declared_node(self):
+        port = Integer()
+        validator = Validator(Dict({"PORT": port}))
+        self.assertTrue(validator.declared_node("PORT") is port)
+        self.assertEqual(validator.declared_node("HOST"), None)
+        self.assertEqual(Validator(Integer()).declared_node("PORT"), None)
+
+
+if __name__ == "__main__":
+    unittest.main()
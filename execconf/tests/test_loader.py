@@ -9,15 +9,50 @@ try:
 except ImportError:
     yaml = None
 import pickle
-from execconf import (ConfigLoader as Loader, ValidatorLoader,
-                      Validator, Builder)
+import shutil
+from tempfile import mkdtemp
+import threading
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+from execconf import (ConfigLoader as Loader, ValidatorLoader, AsyncConfigLoader,
+                      Validator, Builder, CodeCache, DirectoryIndex, BranchCache,
+                      LazyConfig)
+from execconf.validator.nodes import Dict, String
 from execconf.exceptions import (AbsPathError, NotFoundError,
                                  NotFoundExtsError, UndeclaredExtError,
-                                 CircularIncludeError, UnknownFormatterError)
+                                 CircularIncludeError, UnknownFormatterError,
+                                 ValidatorConvertError)
 import data_defaults
 
 MODULE_ROOT = path.dirname(path.abspath(__file__))
 
+def write_file(filepath, content):
+    with open(filepath, "w") as f:
+        f.write(content)
+
+
+class CountLoader(Loader):
+    def __init__(self, *args, **kwargs):
+        super(CountLoader, self).__init__(*args, **kwargs)
+        self.executed = []
+
+    def _run_path(self, filepath, *args, **kwargs):
+        self.executed.append(filepath)
+        return super(CountLoader, self)._run_path(filepath, *args, **kwargs)
+
+
+class BlockLoader(CountLoader):
+    def __init__(self, *args, **kwargs):
+        super(BlockLoader, self).__init__(*args, **kwargs)
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def _run_path(self, filepath, *args, **kwargs):
+        self.started.set()
+        self.release.wait(5)
+        return super(BlockLoader, self)._run_path(filepath, *args, **kwargs)
+
+
 class TestLoader(unittest.TestCase):
     def test_load(self):
         loader1 = Loader(path.join(MODULE_ROOT, "data"))
@@ -164,6 +199,44 @@ class TestLoader(unittest.TestCase):
         self.assertEqual(conf1.FOO, "BUILD")
         self.assertEqual(conf1["BAZ"], 123)
 
+    def test_shared_data(self):
+        class ChangeBuilder(Builder):
+            def build(self, data):
+                data["DB"]["host"] = "changed"
+                data["DEFAULT"]["x"] = "changed"
+                data["LIST"][0].append("changed")
+                return data
+
+        directory = mkdtemp()
+        try:
+            write_file(path.join(directory, "main.py"),
+                       "include('db')\nLIST = [[1]]\nTAGS = set([1])")
+            write_file(path.join(directory, "db.py"),
+                       "DB = {'host': 'localhost'}")
+            for name in ("main.py", "db.py"):
+                os.utime(path.join(directory, name), (1000000000, 1000000000))
+
+            defaults = {"DEFAULT": {"x": 1}}
+            cache = BranchCache()
+            changed = Loader(directory, defaults=defaults, branch_cache=cache,
+                             builder=ChangeBuilder())
+            for kwargs in ({}, {"persistent": True}, {"lazy": True}):
+                loader = Loader(directory, defaults=defaults,
+                                branch_cache=cache, **kwargs)
+                for i in xrange(2):
+                    self.assertEqual(changed.load("main.py").DB["host"], "changed")
+                    conf = loader.load("main.py")
+                    self.assertEqual(conf.DB["host"], "localhost")
+                    self.assertEqual(conf.DEFAULT["x"], 1)
+                    self.assertEqual(conf.LIST, ([1],))
+                    conf.LIST[0].append(2)
+                    self.assertEqual(conf.TAGS, frozenset([1]))
+                    self.assertTrue(isinstance(conf.TAGS, frozenset))
+                    self.assertEqual(loader.load("main.py").LIST, ([1],))
+            self.assertEqual(defaults, {"DEFAULT": {"x": 1}})
+        finally:
+            shutil.rmtree(directory)
+
     def test_extra_data(self):
         loader = Loader(path.join(MODULE_ROOT, "data"))
         conf = loader.load("base.py", extra={"QUX": ["World"], "NEW": 1})
@@ -333,5 +406,507 @@ class TestLoader(unittest.TestCase):
         self.assertEqual(len(conf2), 2)
         self.assertEqual(conf2.FMT, "%%(some)s")
 
+    def test_code_cache(self):
+        cache = CodeCache(max_size=2)
+        loader1 = Loader(path.join(MODULE_ROOT, "data"), code_cache=cache)
+        conf1 = loader1.load("include.py")
+        conf2 = loader1.load("include.py")
+        conf3 = Loader(path.join(MODULE_ROOT, "data")).load("include.py")
+
+        self.assertEqual(conf1, conf3)
+        self.assertEqual(conf2, conf3)
+        # include.py, base.py and include_merge.py with 2 slots
+        self.assertEqual(len(cache), 2)
+
+        cache_dir = mkdtemp()
+        try:
+            disk_cache1 = CodeCache(directory=cache_dir)
+            loader2 = ValidatorLoader(path.join(MODULE_ROOT, "data/validator"),
+                                      code_cache=disk_cache1)
+            v1 = loader2.load("simple_config.validate.py")
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+            disk_cache2 = CodeCache(directory=cache_dir)
+            loader3 = ValidatorLoader(path.join(MODULE_ROOT, "data/validator"),
+                                      code_cache=disk_cache2)
+            v2 = loader3.load("simple_config.validate.py")
+            self.assertEqual(len(disk_cache2), 1)
+            self.assertEqual(v2.validate({"INT": "1"})["INT"], 1)
+
+            # code is kept in memory if cache directory is unusable
+            disk_cache3 = CodeCache(directory=path.join(cache_dir, "missing"))
+            loader4 = ValidatorLoader(path.join(MODULE_ROOT, "data/validator"),
+                                      code_cache=disk_cache3)
+            v3 = loader4.load("simple_config.validate.py")
+            self.assertEqual(len(disk_cache3), 1)
+            self.assertEqual(v3.validate({"INT": "1"})["INT"], 1)
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_defaults_cache(self):
+        directory = mkdtemp()
+        try:
+            defaults = path.join(directory, "defaults.py")
+            write_file(path.join(directory, "main.py"), "A = 1")
+            write_file(defaults, "DEFAULT = 1")
+            os.utime(defaults, (1000000000, 1000000000))
+
+            loader1 = CountLoader(directory, defaults=defaults)
+            loader2 = CountLoader(directory, defaults=defaults)
+            self.assertEqual(loader1.load("main.py").DEFAULT, 1)
+            self.assertEqual(loader2.load("main.py").DEFAULT, 1)
+            self.assertEqual(loader1.executed + loader2.executed,
+                             ["defaults.py", "main.py", "main.py"])
+
+            write_file(defaults, "DEFAULT = 2")
+            os.utime(defaults, (1000000010, 1000000010))
+            self.assertEqual(loader2.load("main.py").DEFAULT, 2)
+            self.assertEqual(loader2.executed[-2:], ["defaults.py", "main.py"])
+
+            # cache is bounded
+            size = Loader._defaults_cache_size
+            Loader._defaults_cache_size = 1
+            try:
+                other = path.join(directory, "other.py")
+                write_file(other, "OTHER = 1")
+                os.utime(other, (1000000000, 1000000000))
+                self.assertEqual(CountLoader(directory, defaults=other)
+                                 .load("main.py").OTHER, 1)
+                self.assertEqual(len(Loader._defaults_cache), 1)
+                loader2.executed = []
+                self.assertEqual(loader2.load("main.py").DEFAULT, 2)
+                self.assertEqual(loader2.executed, ["defaults.py", "main.py"])
+            finally:
+                Loader._defaults_cache_size = size
+
+            # dict defaults are copied on first load
+            dict_defaults = {"DICT": {"a": 1}}
+            loader3 = Loader(directory, defaults=dict_defaults)
+            self.assertEqual(loader3.load("main.py").DICT, {"a": 1})
+            dict_defaults["DICT"]["a"] = 2
+            self.assertEqual(loader3.load("main.py").DICT, {"a": 1})
+        finally:
+            shutil.rmtree(directory)
+
+    def test_branch_cache(self):
+        directory = mkdtemp()
+        try:
+            files = {"a.py": "include('common')\nA = 1",
+                     "b.py": "merge_option('common', 'DB')\nB = 1",
+                     "common.py": "include('db.py')\nCOMMON = 1",
+                     "db.py": "DB = {'host': 'localhost'}"}
+            for name, content in files.iteritems():
+                write_file(path.join(directory, name), content)
+                os.utime(path.join(directory, name), (1000000000, 1000000000))
+
+            cache = BranchCache()
+            loader1 = CountLoader(directory, branch_cache=cache)
+            loader2 = CountLoader(directory, branch_cache=cache)
+            conf_a = loader1.load("a.py")
+            conf_b = loader2.load("b.py")
+            self.assertEqual(loader1.executed, ["a.py", "common.py", "db.py"])
+            self.assertEqual(loader2.executed, ["b.py"])
+            self.assertEqual(conf_a, Loader(directory).load("a.py"))
+            self.assertEqual(conf_b, Loader(directory).load("b.py"))
+            self.assertEqual(sorted(loader2.sources()),
+                             [path.join(directory, f)
+                              for f in ("b.py", "common.py", "db.py")])
+
+            self.assertEqual(loader1.load("a.py"), conf_a)
+            self.assertEqual(loader1.executed[3:], [])
+
+            db = path.join(directory, "db.py")
+            write_file(db, "DB = {'host': 'db'}")
+            os.utime(db, (1000000010, 1000000010))
+            self.assertEqual(loader2.load("b.py").DB["host"], "db")
+            self.assertEqual(loader2.executed[1:], ["db.py"])
+
+            # include is resolved again when file with extension
+            # of higher priority appears
+            loader3 = CountLoader(directory, exts=("yml", "py"),
+                                  branch_cache=cache)
+            self.assertEqual(loader3.load("a.py").COMMON, 1)
+            loader3.executed = []
+            self.assertEqual(loader3.load("a.py").COMMON, 1)
+            self.assertEqual(loader3.executed, [])
+            write_file(path.join(directory, "common.yml"), "COMMON = 2")
+            self.assertEqual(loader3.load("a.py").COMMON, 2)
+            self.assertEqual(loader3.executed, ["a.py", "common.yml"])
+
+            # replayed includes are resolved as usual
+            loader4 = CountLoader(directory, exts=("py", "yml"),
+                                  branch_cache=cache)
+            self.assertEqual(loader4.load("a.py").COMMON, 1)
+            os.remove(path.join(directory, "common.py"))
+            loader4.executed = []
+            self.assertEqual(loader4.load("a.py").COMMON, 2)
+            self.assertEqual(loader4.executed, ["a.py", "common.yml"])
+            loader2.executed = []
+            self.assertRaises(NotFoundExtsError, loader2.load, "b.py")
+            self.assertEqual(loader2.executed, ["b.py"])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_provenance(self):
+        directory = mkdtemp()
+        try:
+            write_file(path.join(directory, "main.py"),
+                       "include('common')\nmerge_option('opts', 'DB')\nA = 1\nB = 2")
+            write_file(path.join(directory, "common.py"), "B = 3\nC = 4")
+            write_file(path.join(directory, "opts.py"), "DB = {'x': 1}\nIGNORED = 1")
+
+            for persistent in (False, True):
+                loader = Loader(directory, defaults={"D": 1},
+                                provenance=True, persistent=persistent)
+                for i in xrange(2):
+                    conf = loader.load("main.py", extra={"E": 5})
+                    main = path.join(directory, "main.py")
+                    common = path.join(directory, "common.py")
+                    self.assertEqual(conf._origin("A"), (main, "dummy"))
+                    self.assertEqual(conf._origin("B"), (common, "include"))
+                    self.assertEqual(conf._origin("DB"),
+                                     (path.join(directory, "opts.py"), "merge_option"))
+                    self.assertEqual(conf._origin("D"), (":defaults:", "dummy"))
+                    self.assertEqual(conf._origin("E"), (":extra:", None))
+                    self.assertEqual(conf._origin("IGNORED"), None)
+                    self.assertEqual(conf._origin_keys(common), ["B", "C"])
+                    self.assertEqual(loader.origins(), conf.__dict__["_origins"])
+
+            # origins of file which stopped including other file
+            write_file(path.join(directory, "a.py"), "include('b')\n")
+            write_file(path.join(directory, "b.py"), "X = 1\n")
+            loader = Loader(directory, persistent=True, provenance=True)
+            self.assertEqual(loader.load("a.py")._origin("X"),
+                             (path.join(directory, "b.py"), "include"))
+            write_file(path.join(directory, "a.py"), "X = 2\n")
+            conf = loader.reload()
+            self.assertEqual(conf._origin("X"), (path.join(directory, "a.py"), "dummy"))
+            self.assertEqual(conf._origin("X"),
+                             Loader(directory, provenance=True).load("a.py")._origin("X"))
+
+            conf = Loader(directory).load("main.py")
+            self.assertEqual(conf._origin("A"), None)
+            self.assertEqual(conf._origin_keys(main), [])
+
+            # origins are stored in snapshot
+            snapshot = path.join(directory, "conf.snapshot")
+            Loader(directory, snapshot=snapshot).load("main.py")
+            for i in xrange(2):
+                loader = CountLoader(directory, snapshot=snapshot,
+                                     provenance=True)
+                conf = loader.load("main.py")
+                self.assertEqual(conf._origin("B"), (common, "include"))
+                self.assertEqual(loader.origins(), conf.__dict__["_origins"])
+            self.assertEqual(loader.executed, [])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_dir_index(self):
+        index = DirectoryIndex()
+        loader1 = Loader(path.join(MODULE_ROOT, "data"), dir_index=index)
+        loader2 = Loader(path.join(MODULE_ROOT, "data"), dir_index=index)
+        conf1 = loader1.load("include")
+        conf2 = loader2.load("include")
+        self.assertEqual(conf1, conf2)
+        self.assertEqual(len(index), 1)
+
+        directory = mkdtemp()
+        try:
+            write_file(path.join(directory, "a.py"), "A = 1")
+            loader3 = Loader(directory, exts=("yml", "py"), dir_index=index)
+            self.assertEqual(loader3.load("a").A, 1)
+            self.assertRaises(NotFoundExtsError, loader3.load, "b")
+
+            # new file is found by next load
+            write_file(path.join(directory, "b.py"), "B = 2")
+            self.assertEqual(loader3.load("b").B, 2)
+            # and file with extension of higher priority
+            write_file(path.join(directory, "a.yml"), "A = 2")
+            os.utime(directory, (1000000000, 1000000000))
+            self.assertEqual(loader3.load("a").A, 2)
+            os.remove(path.join(directory, "a.py"))
+            self.assertRaises(NotFoundError, loader3.load, "a.py")
+        finally:
+            shutil.rmtree(directory)
+
+    def test_reload(self):
+        tmp_dir = mkdtemp()
+        try:
+            write_file(path.join(tmp_dir, "root.py"),
+                       "ROOT = 1\ninclude('a')\nmerge('b')\n")
+            write_file(path.join(tmp_dir, "a.py"),
+                       "A = 1\nDICT = {'a': 1}\ninclude('c')\n")
+            write_file(path.join(tmp_dir, "b.py"),
+                       "B = 1\nDICT = {'b': 1}\n")
+            write_file(path.join(tmp_dir, "c.py"), "C = 1\n")
+
+            loader = CountLoader(tmp_dir, persistent=True,
+                                 defaults={"DEFAULT": True})
+            conf1 = loader.load("root")
+            self.assertEqual(sorted(loader.executed),
+                             ["a.py", "b.py", "c.py", "root.py"])
+            self.assertEqual(conf1.DICT, {"a": 1, "b": 1})
+            self.assertTrue(conf1.DEFAULT)
+
+            loader.executed = []
+            conf2 = loader.reload()
+            self.assertEqual(loader.executed, [])
+            self.assertEqual(conf1, conf2)
+
+            write_file(path.join(tmp_dir, "b.py"),
+                       "B = 2\nDICT = {'b': 22}\n")
+            loader.executed = []
+            conf3 = loader.reload(extra={"EXTRA": 1})
+            self.assertEqual(loader.executed, ["b.py"])
+            self.assertEqual(conf3.B, 2)
+            self.assertEqual(conf3.DICT, {"a": 1, "b": 22})
+            self.assertEqual(conf3.EXTRA, 1)
+            self.assertTrue(conf3.DEFAULT)
+
+            write_file(path.join(tmp_dir, "a.py"), "A = 22\n")
+            loader.executed = []
+            conf4 = loader.reload()
+            self.assertEqual(loader.executed, ["a.py"])
+            self.assertEqual(conf4.A, 22)
+            self.assertTrue("C" not in conf4)
+            self.assertTrue("EXTRA" not in conf4)
+            self.assertFalse(loader._has_tree_branch("c.py"))
+
+            write_file(path.join(tmp_dir, "a.py"), "A = 3\ninclude('root')\n")
+            with self.assertRaises(CircularIncludeError) as cm:
+                loader.reload()
+            with self.assertRaises(CircularIncludeError) as cm:
+                loader.reload()
+
+            # last good tree is kept, only fixed file is executed
+            write_file(path.join(tmp_dir, "a.py"), "A = 4\n")
+            loader.executed = []
+            conf5 = loader.reload()
+            self.assertEqual(loader.executed, ["a.py"])
+            self.assertEqual(conf5.A, 4)
+            self.assertEqual(conf5.B, 2)
+
+            # files changed by reload which failed after execution
+            # are executed again
+            def fail_collect(dirty=None):
+                raise ValueError("merge failed")
+            write_file(path.join(tmp_dir, "b.py"), "B = 6\n")
+            loader._collect_result_data = fail_collect
+            self.assertRaises(ValueError, loader.reload)
+            del loader._collect_result_data
+            loader.executed = []
+            self.assertEqual(loader.reload().B, 6)
+            self.assertEqual(loader.executed, ["b.py"])
+            loader._validator = Validator(Dict({"B": String()}))
+            self.assertRaises(ValidatorConvertError, loader.reload)
+            loader._validator = None
+            self.assertEqual(loader.reload().B, 6)
+
+            loader2 = Loader(tmp_dir, persistent=True)
+            write_file(path.join(tmp_dir, "b.py"), "B = \n")
+            self.assertRaises(SyntaxError, loader2.load, "root")
+            write_file(path.join(tmp_dir, "b.py"), "B = 5\n")
+            self.assertEqual(loader2.reload().B, 5)
+
+            with self.assertRaises(RuntimeError) as cm:
+                Loader(tmp_dir).reload()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_parallel(self):
+        loader2 = Loader(path.join(MODULE_ROOT, "data"), workers=2,
+                         defaults=data_defaults)
+        try:
+            for filepath in ("include", "merge", "merge_option",
+                             "complex_helpers", "deepload"):
+                loader1 = Loader(path.join(MODULE_ROOT, "data"),
+                                 defaults=data_defaults)
+                conf1 = loader1.load(filepath)
+                conf2 = loader2.load(filepath)
+                self.assertEqual(conf1, conf2)
+                pool = loader2._pool
+            # one pool for all loads
+            self.assertTrue(pool is loader2._pool)
+        finally:
+            loader2.close()
+        self.assertTrue(loader2._pool is None)
+
+        loader3 = Loader(path.join(MODULE_ROOT, "data"), workers=2)
+        try:
+            with self.assertRaises(CircularIncludeError) as cm:
+                loader3.load("deepload_except")
+            with self.assertRaises(NotFoundExtsError) as cm:
+                loader3.load(StringIO("FAILED = True\ninclude('notfound')"))
+            self.assertTrue("FAILED" not in loader3.load("base2"))
+
+            # errors of included files can't be caught by including file
+            catch = ("try:\n    include('notfound')\n"
+                     "except Exception:\n    CAUGHT = True\n")
+            self.assertTrue(Loader(path.join(MODULE_ROOT, "data"))
+                            .load(StringIO(catch)).CAUGHT)
+            self.assertRaises(NotFoundExtsError, loader3.load, StringIO(catch))
+        finally:
+            loader3.close()
+
+    def test_stats(self):
+        loader = Loader(path.join(MODULE_ROOT, "data"), stats=True)
+        conf = loader.load("include.py")
+        stats = loader.stats()
+        self.assertEqual(stats.file_count, 3)
+        self.assertEqual(stats.bytes_read,
+                         sum(path.getsize(loader.joinpath(fp))
+                             for fp in ("include.py", "base.py", "include_merge.py")))
+        for phase in ("total", "resolve", "defaults", "execute", "collect", "convert"):
+            self.assertTrue(phase in stats.phases)
+        self.assertEqual(len(stats.edges), 2)
+        self.assertEqual(stats.edges[0][1], "base.py")
+        self.assertTrue(stats.format().startswith("total:"))
+        self.assertEqual(len(stats._to_dict()["files"]), 3)
+
+        # new stats for every load
+        loader.load("base.py")
+        self.assertFalse(loader.stats() is stats)
+        self.assertEqual(loader.stats().file_count, 1)
+
+        # error of file which removes itself is not hidden
+        directory = mkdtemp()
+        try:
+            write_file(path.join(directory, "removed.py"),
+                       "import os\nos.remove(__file__)\nraise ValueError('own')")
+            loader = Loader(directory, stats=True)
+            self.assertRaises(ValueError, loader.load, "removed.py")
+        finally:
+            shutil.rmtree(directory)
 
+        loader = Loader(path.join(MODULE_ROOT, "data"))
+        loader.load("include.py")
+        self.assertFalse(loader.stats().enabled)
+        self.assertEqual(loader.stats().phases, {})
+
+    def test_async(self):
+        loader = BlockLoader(path.join(MODULE_ROOT, "data"))
+        async_loader = AsyncConfigLoader(loader)
+        try:
+            result1 = async_loader.load("base.py")
+            loader.started.wait(5)
+            result2 = async_loader.load("base.py")
+            result3 = async_loader.load("base.py", extra={"A": 1})
+            self.assertTrue(result1 is result2)
+            self.assertFalse(result1 is result3)
+            loader.release.set()
+
+            conf = result1.get(5)
+            self.assertEqual(conf, Loader(path.join(MODULE_ROOT, "data")).load("base.py"))
+            self.assertEqual(result3.get(5).A, 1)
+            self.assertEqual(loader.executed, ["base.py", "base.py"])
+
+            # finished load is not shared
+            result4 = async_loader.load("base.py")
+            self.assertFalse(result4 is result1)
+            self.assertEqual(result4.get(5), conf)
+
+            self.assertRaises(NotFoundError, async_loader.load("missing.py").get, 5)
+        finally:
+            async_loader.close()
+
+        # executor of caller is not closed
+        pool = ThreadPool(1)
+        try:
+            async_loader = AsyncConfigLoader(Loader(path.join(MODULE_ROOT, "data")), pool)
+            self.assertEqual(async_loader.load("base.py").get(5), conf)
+            async_loader.close()
+            self.assertEqual(pool.apply_async(len, ([1],)).get(5), 1)
+        finally:
+            pool.close()
+            pool.join()
+
+        pool = Pool(1)
+        try:
+            self.assertRaises(TypeError, AsyncConfigLoader, loader, pool)
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def test_lazy(self):
+        loader1 = Loader(path.join(MODULE_ROOT, "data"), lazy=True)
+        conf1 = loader1.load("merge")
+        conf2 = Loader(path.join(MODULE_ROOT, "data")).load("merge")
+
+        self.assertTrue(isinstance(conf1, LazyConfig))
+        self.assertEqual(conf1, conf2)
+        self.assertEqual(conf1.OPT3["FOO"]["BAR"], 1)
 
+    def test_snapshot(self):
+        tmp_dir = mkdtemp()
+        try:
+            write_file(path.join(tmp_dir, "root.py"),
+                       "ROOT = 1\ninclude('a')\n")
+            write_file(path.join(tmp_dir, "a.py"), "A = 1\n")
+            write_file(path.join(tmp_dir, "defaults.py"), "DEFAULT = 1\n")
+            snapshot = path.join(tmp_dir, "conf.snapshot")
+
+            loader1 = CountLoader(tmp_dir, snapshot=snapshot,
+                                  defaults=path.join(tmp_dir, "defaults.py"))
+            conf1 = loader1.load("root")
+            self.assertEqual(sorted(loader1.sources()),
+                             [path.join(tmp_dir, "a.py"),
+                              path.join(tmp_dir, "defaults.py"),
+                              path.join(tmp_dir, "root.py")])
+            self.assertTrue(path.exists(snapshot))
+
+            loader2 = CountLoader(tmp_dir, snapshot=snapshot,
+                                  defaults=path.join(tmp_dir, "defaults.py"))
+            conf2 = loader2.load("root")
+            self.assertEqual(loader2.executed, [])
+            self.assertEqual(conf1, conf2)
+            self.assertEqual(len(loader2.sources()), 3)
+
+            conf3 = loader2.load("root", extra={"EXTRA": 1})
+            self.assertEqual(conf3.EXTRA, 1)
+            self.assertEqual(len(loader2.executed), 3)
+
+            write_file(path.join(tmp_dir, "a.py"), "A = 22\n")
+            loader2.executed = []
+            conf4 = loader2.load("root", extra={"EXTRA": 1})
+            self.assertEqual(conf4.A, 22)
+            self.assertEqual(len(loader2.executed), 3)
+
+            # snapshot of loader with other options is not used
+            validator = Validator(Dict({"A": String()}))
+            loader3 = CountLoader(tmp_dir, snapshot=snapshot,
+                                  validator=validator,
+                                  defaults=path.join(tmp_dir, "defaults.py"))
+            self.assertRaises(ValidatorConvertError, loader3.load, "root",
+                              extra={"EXTRA": 1})
+            loader4 = CountLoader(tmp_dir, snapshot=snapshot,
+                                  defaults={"DEFAULT": 2})
+            self.assertEqual(loader4.load("root").DEFAULT, 2)
+            loader4.executed = []
+            self.assertEqual(loader4.load("root").DEFAULT, 2)
+            self.assertEqual(loader4.executed, [])
+
+            # file with extension of higher priority is found
+            loader5 = CountLoader(tmp_dir, snapshot=snapshot, exts=("yml", "py"))
+            self.assertEqual(loader5.load("root").A, 22)
+            self.assertEqual([m[0] for m in loader5.manifest() if m[3] is False],
+                             [path.join(tmp_dir, "a.yml"),
+                              path.join(tmp_dir, "root.yml")])
+            loader5.executed = []
+            self.assertEqual(loader5.load("root").A, 22)
+            self.assertEqual(loader5.executed, [])
+            write_file(path.join(tmp_dir, "a.yml"), "A = 33\n")
+            self.assertEqual(loader5.load("root").A, 33)
+            self.assertEqual(loader5.executed, ["root.py", "a.yml"])
+
+            # config is loaded even if snapshot can't be written
+            loader6 = CountLoader(tmp_dir, snapshot=path.join(tmp_dir, "missing", "conf.snapshot"))
+            self.assertEqual(loader6.load("root").A, 22)
+
+            # snapshot load can be reloaded
+            loader7 = CountLoader(tmp_dir, snapshot=snapshot, persistent=True,
+                                  exts=("yml", "py"))
+            self.assertEqual(loader7.load("root").A, 33)
+            self.assertEqual(loader7.executed, [])
+            self.assertEqual(loader7.reload().A, 33)
+        finally:
+            shutil.rmtree(tmp_dir)
@@ -0,0 +1,79 @@
+import unittest
+import os
+import shutil
+import json
+from os import path
+from tempfile import mkdtemp
+from execconf import Config, SharedConfig
+from execconf.exceptions import SnapshotError
+
+
+class TestSharedConfig(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_attach(self):
+        conf1 = Config({"STR": "foo",
+                        "UNICODE": u"\u0444\u0443",
+                        "INT": -123,
+                        "LONG": 1 << 70,
+                        "FLOAT": 1.5,
+                        "BOOL": True,
+                        "NONE": None,
+                        "LIST": [1, {"foo": "bar"}, ("baz",)],
+                        "SET": frozenset([1, 2]),
+                        "DICT": {"foo": {"bar": "foo"}, 1: False}})
+        filepath = path.join(self.tmp_dir, "conf.shared")
+        conf1._to_shared(filepath)
+        conf2 = SharedConfig.attach(filepath)
+
+        self.assertEqual(len(conf2), len(conf1))
+        self.assertEqual(conf2, conf1)
+        self.assertEqual(conf1, conf2)
+        self.assertEqual(conf2.STR, "foo")
+        self.assertTrue(isinstance(conf2.STR, str))
+        self.assertTrue(isinstance(conf2.UNICODE, unicode))
+        self.assertEqual(conf2.LONG, 1 << 70)
+        self.assertTrue(isinstance(conf2.LIST, tuple))
+        self.assertEqual(conf2.LIST[1].foo, "bar")
+        self.assertTrue(conf2.DICT is conf2["DICT"])
+        self.assertEqual(conf2.DICT[1], False)
+        self.assertTrue("DICT" in conf2)
+        self.assertEqual(conf2.get("NOTFOUND", 1), 1)
+        self.assertEqual(conf2._to_dict(), conf1._to_dict())
+        self.assertEqual(json.loads(conf2.DICT.foo._to_json()), {"bar": "foo"})
+
+        with self.assertRaises(AttributeError):
+            conf2.NOTFOUND
+        with self.assertRaises(AttributeError):
+            conf2.STR = "bar"
+        with self.assertRaises(TypeError):
+            conf2["STR"] = "bar"
+
+    def test_config_compat(self):
+        # items named like methods are looked up as in Config
+        conf1 = Config({"keys": 1, "items": {"a": 1}, "get": [2], "_x": 3,
+                        "NESTED": {"a": (1, {"b": frozenset([2])})}})
+        filepath = path.join(self.tmp_dir, "conf.shared")
+        conf1._to_shared(filepath)
+        conf2 = SharedConfig.attach(filepath)
+        for name in ("keys", "items", "get", "_x"):
+            self.assertEqual(getattr(conf2, name), getattr(conf1, name))
+        self.assertEqual(conf2.items.a, 1)
+        self.assertEqual(sorted(SharedConfig.keys(conf2)), sorted(conf1))
+        self.assertEqual(conf2, conf1)
+        self.assertEqual(conf2._to_dict(), conf1._to_dict())
+
+        self.assertEqual(hash(conf2), hash(conf1))
+        self.assertEqual(hash(conf2.NESTED), hash(conf1.NESTED))
+        self.assertTrue(conf2 in set([conf1]))
+        self.assertEqual({conf1: 1}[conf2], 1)
+
+    def test_errors(self):
+        with self.assertRaises(SnapshotError):
+            SharedConfig.from_string("not a shared config")
+        with self.assertRaises(SnapshotError):
+            Config({"FOO": object()})._to_shared(path.join(self.tmp_dir, "f"))
@@ -0,0 +1,69 @@
+import unittest
+import os
+import shutil
+from os import path
+from StringIO import StringIO
+from tempfile import mkdtemp
+from execconf import Config, LazyConfig
+from execconf.snapshot import (dump_snapshot, load_snapshot, build_manifest,
+                               check_manifest)
+from execconf.validator.nodes import Integer
+from execconf.exceptions import SnapshotError
+
+
+class TestSnapshot(unittest.TestCase):
+    def test_config(self):
+        conf1 = Config({"foo": {"bar": [1, 2.5, u"baz"]},
+                        "list": [{"foo": None}],
+                        "set": set([1])})
+        raw = conf1._to_snapshot()
+        conf2 = Config.from_snapshot(raw)
+        conf3 = LazyConfig.from_snapshot(StringIO(raw))
+
+        self.assertEqual(conf1, conf2)
+        self.assertEqual(conf1, conf3)
+        self.assertTrue(isinstance(conf2.foo, Config))
+        self.assertTrue(isinstance(conf3, LazyConfig))
+
+        with self.assertRaises(SnapshotError):
+            Config.from_snapshot("not a snapshot")
+        with self.assertRaises(SnapshotError):
+            Config.from_snapshot(raw[:-2])
+        with self.assertRaises(SnapshotError):
+            Config({"node": Integer()})._to_snapshot()
+
+    def test_manifest(self):
+        tmp_dir = mkdtemp()
+        try:
+            filepath = path.join(tmp_dir, "conf.py")
+            with open(filepath, "w") as f:
+                f.write("FOO = 1\n")
+            manifest = build_manifest([filepath])
+            data, manifest2, key, origins = load_snapshot(
+                    dump_snapshot({"FOO": 1}, manifest=manifest, key="key"))
+
+            self.assertEqual(data, {"FOO": 1})
+            self.assertEqual(key, "key")
+            self.assertTrue(check_manifest(manifest2))
+
+            # same content with other mtime
+            st = os.stat(filepath)
+            os.utime(filepath, (st.st_atime, st.st_mtime + 10))
+            self.assertTrue(check_manifest(manifest2))
+
+            with open(filepath, "w") as f:
+                f.write("FOO = 2\n")
+            self.assertFalse(check_manifest(manifest2))
+
+            os.remove(filepath)
+            self.assertFalse(check_manifest(manifest2))
+            self.assertFalse(check_manifest(build_manifest([filepath])))
+
+            # absent file is created
+            manifest3 = build_manifest([], absent=[filepath])
+            self.assertTrue(check_manifest(manifest3))
+            with open(filepath, "w") as f:
+                f.write("FOO = 3\n")
+            self.assertFalse(check_manifest(manifest3))
+        finally:
+            shutil.rmtree(tmp_dir)
@@ -27,4 +27,83 @@ class TestUtils(unittest.TestCase):
         self.assertEqual(res[0], "foo BAR baz")
         self.assertEqual(res[1], 123)
 
+    def test_deep_merge(self):
+        left = {"foo": {"bar": 1, "baz": [1]}, "qux": 1}
+        right = {"foo": {"bar": 2}, "new": {"key": "value"}}
+        res = deep_merge(left, right)
 
+        self.assertEqual(res, {"foo": {"bar": 2, "baz": [1]},
+                               "qux": 1,
+                               "new": {"key": "value"}})
+        self.assertTrue(res["foo"]["baz"] is not left["foo"]["baz"])
+        self.assertTrue(res["new"] is not right["new"])
+        self.assertEqual(deep_merge({"foo": 1}, 2), 2)
+
+    def test_cow_merge(self):
+        left = {"foo": {"bar": 1, "baz": [1]}, "qux": {"quux": 1}}
+        right = {"foo": {"bar": 2}, "new": {"key": "value"}}
+        res = cow_merge(left, right)
+
+        self.assertEqual(res, deep_merge(left, right))
+        # untouched subtrees are shared
+        self.assertTrue(res["qux"] is left["qux"])
+        self.assertTrue(res["foo"]["baz"] is left["foo"]["baz"])
+        self.assertTrue(res["new"] is right["new"])
+        # merged path is copied, sources stay the same
+        self.assertTrue(res["foo"] is not left["foo"])
+        self.assertEqual(left["foo"]["bar"], 1)
+        self.assertEqual(len(left), 2)
+
+        res = cow_update(left, right)
+        self.assertEqual(res["foo"], {"bar": 2})
+        self.assertTrue(res["qux"] is left["qux"])
+        self.assertEqual(cow_update(left, None), left)
+
+    def test_hash(self):
+        # -1 and -2 have same hash, so dicts are iterated in different order
+        d1 = {-1: "foo", -2: {"bar": [1, 2]}}
+        d2 = {-2: {"bar": [1, 2]}}
+        d2[-1] = "foo"
+        self.assertNotEqual(d1.keys(), d2.keys())
+
+        self.assertEqual(make_hashable(d1), make_hashable(d2))
+        self.assertEqual(hash(frozendict(d1)), hash(frozendict(d2)))
+        self.assertNotEqual(hash(frozendict(d1)), hash(frozendict({-1: "foo"})))
+        self.assertEqual(len(set([frozendict(d1), frozendict(d2)])), 1)
+
+        fd = frozendict({"foo": {"bar": 1}})
+        h = hash(fd)
+        self.assertEqual(fd._cached_hash, h)
+        self.assertEqual(fd["foo"]._cached_hash, hash(fd["foo"]))
+        self.assertEqual(hash(fd), h)
+
+    def test_replacement_engine(self):
+        repl = {"foo": "FOO", "bar": "BAR"}
+        shared = {"list": ["foo", 1], "dict": {"foo": "bar"}}
+        data = {"%(foo)s": "%(bar)s baz",
+                "list": ["%(foo)s", 123, ("%(bar)s", "bar")],
+                "dict": {"foo": {"bar": "%(foo)s"}, "bar": "baz"},
+                "escape": "%%(foo)s",
+                "shared": shared}
+        engine = ReplacementEngine()
+        res = engine.render(data, repl)
+
+        self.assertEqual(res, recursive_fmt(data, repl))
+        self.assertEqual(res["FOO"], "BAR baz")
+        self.assertEqual(res["escape"], "%(foo)s")
+        self.assertTrue(isinstance(res["list"][2], tuple))
+        self.assertTrue(res["shared"] is shared)
+        self.assertTrue(res["dict"]["bar"] is data["dict"]["bar"])
+        self.assertTrue(res["dict"] is not data["dict"])
+        self.assertEqual(data["list"][0], "%(foo)s")
+
+        # plans are reused for the same containers
+        data2 = dict(data)
+        data2["new"] = "%(bar)s"
+        res2 = engine.render(data2, {"foo": 1, "bar": 2})
+        self.assertTrue(id(data["list"]) in engine._prev_plans)
+        self.assertTrue(id(data) not in engine._prev_plans)
+        self.assertEqual(res2["new"], "2")
+        self.assertEqual(res2["list"][0], "1")
+        self.assertEqual(engine.render("%(foo)s", repl), "FOO")
+        self.assertEqual(engine.render(1, repl), 1)
@@ -7,7 +7,8 @@ from execconf.validator.nodes import Boolean, Integer, Float, String, List, \
                                      ListBoolean, ListInteger, ListFloat, \
                                      ListString, ListDict, Dict, Option, \
                                      Pass
-from execconf.exceptions import ValidatorConvertError, ValidatorCheckError 
+from execconf.exceptions import ValidatorConvertError, ValidatorCheckError, \
+                                 ValidatorErrors
 
 
 MODULE_ROOT = path.dirname(path.abspath(__file__))
@@ -35,6 +36,80 @@ class TestValidator(unittest.TestCase):
                 "BAR": "onn"    
             })
 
+    def test_collect_errors(self):
+        node = Dict({
+            "DB": Dict({
+                "replicas": ListDict(),
+                "ports": List([Integer(max=100)], max=3),
+                "name": String()
+            }, required=["name"]),
+            "DEBUG": Boolean(),
+            "MODE": Option("fast", Integer())
+        })
+        data = {
+            "DB": {"replicas": [{}, 1, {}, "x"],
+                   "ports": ["1", "foo", 200, 3]},
+            "DEBUG": "maybe",
+            "MODE": "slow"
+        }
+        v = Validator(node, collect_errors=True)
+        with self.assertRaises(ValidatorErrors) as cm:
+            v.validate(data)
+        errors = cm.exception.errors
+        self.assertEqual(sorted(path for path, e in errors),
+                         ["DB.name", "DB.ports", "DB.ports[1]", "DB.ports[2]",
+                          "DB.replicas[1]", "DB.replicas[3]", "DEBUG", "MODE"])
+        self.assertFalse(cm.exception.truncated)
+        self.assertTrue(isinstance(dict(errors)["DEBUG"], ValidatorConvertError))
+        self.assertTrue("DB.ports[1]: " in str(cm.exception))
+
+        with self.assertRaises(ValidatorErrors) as cm:
+            Validator(node, collect_errors=True, max_errors=3).validate(data)
+        self.assertEqual(len(cm.exception.errors), 3)
+        self.assertTrue(cm.exception.truncated)
+        # exactly max_errors errors are not truncated
+        with self.assertRaises(ValidatorErrors) as cm:
+            Validator(node, collect_errors=True, max_errors=8).validate(data)
+        self.assertEqual(len(cm.exception.errors), 8)
+        self.assertFalse(cm.exception.truncated)
+        with self.assertRaises(ValidatorErrors) as cm:
+            Validator(node, collect_errors=True, max_errors=7).validate(data)
+        self.assertEqual(len(cm.exception.errors), 7)
+        self.assertTrue(cm.exception.truncated)
+
+        self.assertRaises(ValueError, Validator, node, collect_errors=True, compiled=True)
+        self.assertRaises(ValueError, Validator, node, collect_errors=True, incremental=True)
+
+        valid = {"DB": {"replicas": [{}], "ports": ["1"], "name": "db"},
+                 "DEBUG": "on", "MODE": "5"}
+        self.assertEqual(v.validate(valid), node.check(valid))
+        self.assertEqual(v.validate(valid)["MODE"], 5)
+
+    def test_option_errors(self):
+        class Broken(Integer):
+            def check(self, value):
+                raise KeyError(value)
+
+        node = Option(String(), Broken())
+        self.assertEqual(node.check("foo"), "foo")
+        # only validation errors mean that option doesn't match
+        self.assertRaises(KeyError, node.check, 1)
+        self.assertRaises(ValidatorCheckError, Option(String(), Integer()).check, None)
+
+        # subclass check may accept more types than its base class
+        class Port(String):
+            def check(self, value):
+                return String.check(self, unicode(value))
+
+        self.assertEqual(Option(Port()).check(8080), u"8080")
+        self.assertEqual(Validator(Option(Port()), compiled=True).validate(8080), u"8080")
+
+        for node in (Option(Integer(), "x"), Option(Float(precision=2), "x")):
+            for value in (float("inf"), float("nan")):
+                self.assertRaises(ValidatorCheckError, node.check, value)
+                self.assertRaises(ValidatorCheckError,
+                                  Validator(node, compiled=True).validate, value)
+
 
 class TestValidatorLoader(unittest.TestCase):
     def test_load(self):
@@ -0,0 +1,168 @@
+import unittest
+from os import path
+import pickle
+import shutil
+from tempfile import mkdtemp
+from execconf import ValidatorLoader, ConfigLoader, Validator
+from execconf.validator.compiler import compile_node, ValidationMemo
+from execconf.validator.nodes import Boolean, Integer, Float, String, List, \
+                                     ListInteger, ListDict, Dict, Option, \
+                                     Pass
+from execconf.exceptions import ValidatorConvertError, ValidatorCheckError
+
+
+MODULE_ROOT = path.dirname(path.abspath(__file__))
+VALID_ROOT = path.join(MODULE_ROOT, "data/validator")
+
+class Odd(Integer):
+    def check(self, value):
+        value = super(Odd, self).check(value)
+        if not value % 2:
+            raise ValidatorCheckError("value %s is not odd" % value)
+        return value
+
+
+class TestValidatorCompiler(unittest.TestCase):
+    def assertSameCheck(self, node, value):
+        check = compile_node(node)
+        try:
+            expected = node.check(value)
+        except (ValidatorConvertError, ValidatorCheckError), e:
+            with self.assertRaises(type(e)) as cm:
+                check(value)
+            self.assertEqual(str(cm.exception), str(e))
+        else:
+            result = check(value)
+            self.assertEqual(result, expected)
+            self.assertEqual(type(result), type(expected))
+
+    def test_scalars(self):
+        nodes_values = [
+            (Pass(), ["foo", 1, None]),
+            (Boolean(), [True, "on", "OFF", 0, 1, 2, "foo"]),
+            (Boolean(eq=True), [True, "no"]),
+            (String(), ["foo", u"bar", 1, "\xff"]),
+            (String(eq="foo"), ["foo", "bar"]),
+            (String(min=2, max=3), ["f", "fo", "foo", "fooo"]),
+            (Integer(), [1, "2", 3.5, "foo", None]),
+            (Integer(eq=2), [2, 3]),
+            (Integer(lt=5, gt=1), [0, 1, 2, 5]),
+            (Integer(lte=5, gte=1, min=2, max=4), [0, 1, 2, 5]),
+            (Float(), [1, "2.5", "foo"]),
+            (Float(precision=2, max=10), ["1.2345", 11]),
+            (Option("foo", 2, Integer(gt=10)), ["foo", 2, 11, "11", 3]),
+            (Option(String(), "foo", Integer(gt=10), 5, [1, 2]),
+                ["foo", 11, 5.0, [1, 2], [1], 3]),
+            (Odd(), [1, 2, "foo"])
+        ]
+        for node, values in nodes_values:
+            for value in values:
+                self.assertSameCheck(node, value)
+
+    def test_containers(self):
+        nodes_values = [
+            (List(), [[1, 2], (1,), 1]),
+            (List(force=True, min=1, max=2), [1, [], [1, 2, 3]]),
+            (List([Integer(), String()]), [[1, "foo", "2", "bar"], [1, 2]]),
+            (List([Integer(), String()], loop=False), [[1, "foo"], [1, "foo", 2]]),
+            (ListInteger(), [["1", 2], [1, "foo"]]),
+            (ListDict(), [[{"foo": 1}], [1]]),
+            (Dict(), [{"foo": 1}, [1]]),
+            (Dict({"FOO": Integer(), "BAR": Boolean()}, required=["FOO"]),
+                [{"FOO": "1", "BAR": "yes", "BAZ": 1}, {"BAR": 1}, {"FOO": "foo"}]),
+            (Dict({String(): Integer()}, min=1, max=2),
+                [{"foo": "1"}, {}, {1: 1}, {"a": 1, "b": 2, "c": 3}]),
+            (Dict({"LIST": ListDict(), Integer(): Dict({"FOO": Float()})}),
+                [{"LIST": [{}], "1": {"FOO": "1.5"}}, {"1": {"FOO": "foo"}}])
+        ]
+        for node, values in nodes_values:
+            for value in values:
+                self.assertSameCheck(node, value)
+
+    def test_incremental(self):
+        checked = []
+        class CountDict(Dict):
+            __slots__ = ()
+            def check(self, value):
+                checked.append(value)
+                return super(CountDict, self).check(value)
+
+        node = Dict({"DB": Dict({"PORT": Integer()}),
+                     "HOSTS": ListDict(),
+                     "COUNTED": CountDict()})
+        validator = Validator(node, incremental=True)
+        db = {"PORT": "5432"}
+        hosts = [{"name": "a"}]
+        counted = {"A": 1}
+        result1 = validator.validate({"DB": db, "HOSTS": hosts, "COUNTED": counted})
+        self.assertEqual(result1, node.check({"DB": db, "HOSTS": hosts, "COUNTED": counted}))
+        self.assertEqual(len(checked), 2)
+
+        # unchanged subtrees are taken from previous validation
+        result2 = validator.validate({"DB": db, "HOSTS": hosts, "COUNTED": counted})
+        self.assertTrue(result2["DB"] is result1["DB"])
+        self.assertTrue(result2["HOSTS"] is result1["HOSTS"])
+        self.assertEqual(len(checked), 2)
+
+        result3 = validator.validate({"DB": {"PORT": "1"}, "HOSTS": hosts,
+                                      "COUNTED": counted})
+        self.assertEqual(result3["DB"], {"PORT": 1})
+        self.assertTrue(result3["HOSTS"] is result1["HOSTS"])
+
+        # only two last validations are kept
+        validator.validate({"DB": db, "HOSTS": [], "COUNTED": counted})
+        validator.validate({"DB": db, "HOSTS": [], "COUNTED": counted})
+        self.assertFalse(validator.validate({"DB": db, "HOSTS": hosts,
+                                             "COUNTED": counted})["HOSTS"] is result1["HOSTS"])
+
+        # values changed in place are checked again
+        db["PORT"] = "foo"
+        with self.assertRaises(ValidatorConvertError):
+            validator.validate({"DB": db, "HOSTS": hosts, "COUNTED": counted})
+        db["PORT"] = "6432"
+        hosts.append({"name": "b"})
+        result4 = validator.validate({"DB": db, "HOSTS": hosts, "COUNTED": counted})
+        self.assertEqual(result4["DB"], {"PORT": 6432})
+        self.assertEqual(result4["HOSTS"], [{"name": "a"}, {"name": "b"}])
+        db["PORT"] = "5432"
+        del hosts[1]
+
+        # equal values are not checked again
+        del checked[:]
+        validator.validate({"DB": dict(db), "HOSTS": list(hosts), "COUNTED": dict(counted)})
+        self.assertEqual(checked, [])
+
+        with self.assertRaises(ValidatorConvertError):
+            validator.validate({"DB": {"PORT": "foo"}})
+
+        memo = ValidationMemo()
+        check = compile_node(node, memo=memo)
+        check({"DB": db, "HOSTS": hosts})
+        self.assertEqual(len(memo), 4)
+        memo.clear()
+        self.assertEqual(len(memo), 0)
+
+        restored = pickle.loads(pickle.dumps(Validator(Dict({"DB": Dict({"PORT": Integer()})}),
+                                                       incremental=True)))
+        self.assertEqual(restored.validate({"DB": db}), {"DB": {"PORT": 5432}})
+
+    def test_loader(self):
+        loader = ValidatorLoader(VALID_ROOT, compiled=True)
+        v1 = loader.load("simple_config.validate.py")
+        v2 = ValidatorLoader(VALID_ROOT).load("simple_config.validate.py")
+        data = ConfigLoader(VALID_ROOT)._load("simple_config.py")
+
+        self.assertEqual(v1.validate(data), v2.validate(data))
+        with self.assertRaises(ValidatorConvertError) as cm:
+            v1.validate({"INT": "foo"})
+
+        # constants of validation file are not nodes
+        tmp_dir = mkdtemp()
+        try:
+            with open(path.join(tmp_dir, "validate.py"), "w") as f:
+                f.write("EXEC_ONLY_DECLARED = True\nFOO = Integer()\n")
+            for kwargs in ({}, {"compiled": True}, {"incremental": True}):
+                validator = ValidatorLoader(tmp_dir, **kwargs).load("validate.py")
+                self.assertEqual(validator.validate({"FOO": "1"}), {"FOO": 1})
+        finally:
+            shutil.rmtree(tmp_dir)
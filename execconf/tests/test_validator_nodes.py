@@ -1,4 +1,5 @@
 import unittest
+import pickle
 from execconf.validator.nodes import Boolean, Integer, Float, String, List, \
                                      ListBoolean, ListInteger, ListFloat, \
                                      ListString, ListDict, Dict, Option, \
@@ -7,6 +8,10 @@ from execconf.exceptions import ValidatorConvertError, ValidatorCheckError, \
                                 ValidatorNodeError
 
 
+class MyInteger(Integer):
+    pass
+
+
 class TestValidatorNodes(unittest.TestCase):
     def test_boolean(self):
         node = Boolean()
@@ -449,11 +454,94 @@ class TestValidatorNodes(unittest.TestCase):
         with self.assertRaisesRegexp(ValidatorCheckError, "not contains in options"):
             node2.check(None)
 
+    def test_option_dispatch(self):
+        node = Option(String(), "foo", Integer(gt=10), 5, [1, 2], Dict())
+
+        # options keep declaration order
+        self.assertTrue(type(node.check("foo")) is unicode)
+        self.assertEqual(node.check(11), 11)
+        self.assertEqual(node.check("12"), u"12")
+        self.assertTrue(node.check(5.0) == 5 and type(node.check(5.0)) is int)
+        self.assertEqual(node.check([1, 2]), [1, 2])
+        self.assertEqual(node.check({"a": 1}), {"a": 1})
+        with self.assertRaisesRegexp(ValidatorCheckError, "not contains in options"):
+            node.check(3)
+        with self.assertRaisesRegexp(ValidatorCheckError, "not contains in options"):
+            node.check([1])
+
+        # unhashable values are compared with all literals
+        node2 = Option(frozenset([1]), 2, [3])
+        self.assertEqual(node2.check(set([1])), frozenset([1]))
+        self.assertEqual(node2.check([3]), [3])
+        with self.assertRaisesRegexp(ValidatorCheckError, "not contains in options"):
+            node2.check(set([2]))
+
+        # the same type is dispatched the same way again
+        self.assertEqual(node.check(12), 12)
+        self.assertEqual(node.check("13"), u"13")
+        with self.assertRaisesRegexp(ValidatorCheckError, "not contains in options"):
+            node.check(3)
+
+        # subclasses may accept more types or look at more than type
+        class Port(String):
+            def check(self, value):
+                return String.check(self, unicode(value))
+
+        class Even(Integer):
+            __slots__ = ()
+            def _accepts(self, value):
+                return isinstance(value, int) and value % 2 == 0
+
+        class Named(Pass):
+            __slots__ = ()
+            def _accepts(self, value):
+                return hasattr(value, "name")
+
+        class OldNamed:
+            name = "old"
+
+        class OldAnonymous:
+            pass
+
+        node = Option(Port(), Integer())
+        self.assertEqual(node.check(8080), u"8080")
+        self.assertEqual(node.check(8081), u"8081")
+        node = Option(Even(), String())
+        with self.assertRaisesRegexp(ValidatorCheckError, "not contains in options"):
+            node.check(3)
+        self.assertEqual(node.check(2), 2)
+        node = Option(Named(), "old")
+        self.assertRaises(ValidatorCheckError, node.check, OldAnonymous())
+        named = OldNamed()
+        self.assertTrue(node.check(named) is named)
+        self.assertEqual(node.check("old"), "old")
+
     def test_pass(self):
         node1 = Pass()
         self.assertEqual(node1.check("foo"), "foo")
         self.assertEqual(node1.check(True), True)
         self.assertEqual(node1.check(1), 1)
 
-
-
+    def test_slots(self):
+        self.assertTrue(Integer() is Integer())
+        self.assertTrue(ListInteger() is ListInteger())
+        self.assertTrue(ListInteger()._decl[0] is Integer())
+        self.assertTrue(Integer() is not Float())
+        self.assertTrue(Integer(min=1) is not Integer(min=1))
+        self.assertTrue(MyInteger() is not MyInteger())
+        self.assertFalse(hasattr(Integer(min=1), "__dict__"))
+        self.assertFalse(hasattr(Dict({"FOO": String()}), "__dict__"))
+
+        node1 = Dict({"FOO": Float(precision=1), "BAR": Option("foo", 1)},
+                     required=["FOO"])
+        for protocol in (0, 2):
+            node2 = pickle.loads(pickle.dumps(node1, protocol))
+            self.assertEqual(node2.check({"FOO": "1.23", "BAR": 1}),
+                             {"FOO": 1.2, "BAR": 1})
+            with self.assertRaises(ValidatorCheckError):
+                node2.check({"BAR": 1})
+
+        node3 = pickle.loads(pickle.dumps(MyInteger(max=2)))
+        self.assertTrue(isinstance(node3, MyInteger))
+        with self.assertRaises(ValidatorCheckError):
+            node3.check(3)
@@ -0,0 +1,153 @@
+import unittest
+import os
+from os import path
+import time
+import shutil
+from tempfile import mkdtemp
+from Queue import Queue
+from execconf import ConfigLoader as Loader
+from execconf.exceptions import NotFoundExtsError
+from execconf.watcher import ConfigWatcher, _InotifyPoller, _StatPoller
+
+
+def write_file(filepath, content):
+    with open(filepath, "w") as f:
+        f.write(content)
+
+
+def touch_later(filepath, content):
+    # mtime resolution of some filesystems is one second
+    st = os.stat(filepath)
+    write_file(filepath, content)
+    os.utime(filepath, (st.st_atime, st.st_mtime + 2))
+
+
+class TestWatcher(unittest.TestCase):
+    def setUp(self):
+        self.directory = mkdtemp()
+        write_file(path.join(self.directory, "main.py"),
+                   "include('sub.py')\nA = 1\n")
+        write_file(path.join(self.directory, "sub.py"), "B = 1\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _check_watcher(self, use_inotify):
+        loader = Loader(self.directory, persistent=True, exts=("yml", "py"))
+        queue = Queue()
+        published = []
+        errors = []
+        watcher = ConfigWatcher(loader, "main.py", interval=0.05,
+                                debounce=0.05, use_inotify=use_inotify,
+                                queue=queue)
+        watcher.subscribe(published.append, errors.append)
+        conf = watcher.start()
+        try:
+            self.assertEqual(conf.B, 1)
+
+            touch_later(path.join(self.directory, "sub.py"), "B = 2\n")
+            conf = queue.get(timeout=5)
+            self.assertEqual(conf.A, 1)
+            self.assertEqual(conf.B, 2)
+            self.assertEqual(published, [conf])
+            self.assertTrue(watcher.config is conf)
+
+            # broken file keeps last good config
+            touch_later(path.join(self.directory, "main.py"), "A = \n")
+            deadline = time.time() + 5
+            while not errors and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(len(errors), 1)
+            self.assertTrue(watcher.error is errors[0])
+            self.assertTrue(watcher.config is conf)
+
+            touch_later(path.join(self.directory, "main.py"),
+                        "include('sub.py')\nA = 3\n")
+            conf = queue.get(timeout=5)
+            self.assertEqual(conf.A, 3)
+            self.assertTrue(watcher.error is None)
+
+            # broken new include is watched
+            new = path.join(self.directory, "new.py")
+            write_file(new, "C = \n")
+            touch_later(path.join(self.directory, "main.py"),
+                        "include('sub.py')\ninclude('new.py')\nA = 4\n")
+            deadline = time.time() + 5
+            while len(errors) < 2 and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(len(errors), 2)
+            touch_later(new, "C = 1\n")
+            conf = queue.get(timeout=5)
+            self.assertEqual(conf.C, 1)
+
+            # missing include is watched
+            touch_later(path.join(self.directory, "main.py"),
+                        "include('sub.py')\ninclude('new.py')\ninclude('late')\nA = 5\n")
+            deadline = time.time() + 5
+            while len(errors) < 3 and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertTrue(isinstance(errors[-1], NotFoundExtsError))
+            write_file(path.join(self.directory, "late.py"), "D = 1\n")
+            conf = queue.get(timeout=5)
+            self.assertEqual(conf.D, 1)
+
+            # file with extension of higher priority is watched
+            write_file(path.join(self.directory, "late.yml"), "D = 2\n")
+            conf = queue.get(timeout=5)
+            self.assertEqual(conf.D, 2)
+
+            # failed callback doesn't stop watcher
+            def fail(conf):
+                raise ValueError("callback")
+            watcher.subscribe(fail)
+            touch_later(path.join(self.directory, "sub.py"), "B = 3\n")
+            self.assertEqual(queue.get(timeout=5).B, 3)
+            self.assertTrue(isinstance(errors[-1], ValueError))
+            watcher.unsubscribe(fail)
+            touch_later(path.join(self.directory, "sub.py"), "B = 4\n")
+            self.assertEqual(queue.get(timeout=5).B, 4)
+        finally:
+            watcher.stop()
+
+        # stopped watcher is started again
+        conf = watcher.start()
+        try:
+            self.assertEqual(conf.B, 4)
+            touch_later(path.join(self.directory, "sub.py"), "B = 5\n")
+            self.assertEqual(queue.get(timeout=5).B, 5)
+        finally:
+            watcher.stop()
+
+    def test_stat_poller(self):
+        self._check_watcher(False)
+
+    def test_poller_fallback(self):
+        class FailedPoller(object):
+            closed = False
+
+            def watch(self, filepaths):
+                raise OSError(28, "no space left on device")
+
+            def close(self):
+                self.closed = True
+
+        watcher = ConfigWatcher(Loader(self.directory), "main.py")
+        watcher.start()
+        try:
+            failed = watcher._poller = FailedPoller()
+            watcher._watch()
+            self.assertTrue(failed.closed)
+            self.assertTrue(isinstance(watcher._poller, _StatPoller))
+        finally:
+            watcher.stop()
+
+    def test_inotify(self):
+        try:
+            _InotifyPoller(None).close()
+        except (OSError, AttributeError):
+            return
+        self._check_watcher(True)
+
+
+if __name__ == "__main__":
+    unittest.main()
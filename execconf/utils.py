@@ -1,7 +1,9 @@
+import sys
 import copy
 
-__all__ = ["frozendict", "make_hashable", "deep_merge",
-           "recursive_fmt", "to_primitive"]
+__all__ = ["frozendict", "make_hashable", "deep_merge", "cow_merge",
+           "cow_update", "recursive_fmt", "ReplacementEngine",
+           "to_primitive"]
 
 def make_hashable(obj):
     if isinstance(obj, (list, tuple)):
@@ -9,9 +11,46 @@ def make_hashable(obj):
     if isinstance(obj, set):
         return frozenset(obj)
     if isinstance(obj, dict):
-        return tuple(make_hashable(i) for i in obj.iteritems())
+        return frozenset((k, make_hashable(v)) for k, v in obj.iteritems())
     return obj
 
+_HASH_MASK = sys.maxsize * 2 + 1
+
+def _hash_value(obj):
+    if isinstance(obj, frozendict):
+        # cached in frozendict
+        return hash(obj)
+    if isinstance(obj, dict):
+        return _hash_items(obj)
+    if isinstance(obj, (list, tuple)):
+        return hash(tuple(_hash_value(sub) for sub in obj))
+    if isinstance(obj, set):
+        return hash(frozenset(obj))
+    return hash(obj)
+
+def _hash_items(obj, items=None):
+    # combine items hashes independent of order, like frozenset does
+    if items is None:
+        items = dict.iteritems(obj)
+    h = 1927868237 * (len(obj) + 1)
+    for k, v in items:
+        ih = hash((k, _hash_value(v)))
+        h ^= (ih ^ (ih << 16) ^ 89869747) * 3644798167
+    h &= _HASH_MASK
+    if h > sys.maxsize:
+        h -= _HASH_MASK + 1
+    if h == -1:
+        h = 590923713
+    return int(h)
+
+def _frozen_item(cls, elm):
+    if isinstance(elm, dict):
+        return cls(elm)
+    if isinstance(elm, (list, tuple, set)):
+        # nested containers may be shared with loader data
+        return copy.deepcopy(elm)
+    return elm
+
 class frozendict(dict):
     def _blocked_attribute(self, *args, **kwargs):
         raise AttributeError("A %s cannot be modified." % self.__class__.__name__)
@@ -30,14 +69,10 @@ class frozendict(dict):
                 for k, v in arg.items():
                     if isinstance(v, dict):
                         arg[k] = cls(v)
-                    elif isinstance(v, list):
-                        v_ = list()
-                        for elm in v:
-                            if isinstance(elm, dict):
-                                v_.append(cls(elm))
-                            else:
-                                v_.append(elm)
-                        arg[k] = tuple(v_)
+                    elif isinstance(v, (list, tuple)):
+                        arg[k] = tuple(_frozen_item(cls, elm) for elm in v)
+                    elif isinstance(v, set):
+                        arg[k] = frozenset(v)
                 args_.append(arg)
             else:
                 args_.append(arg)
@@ -52,7 +87,9 @@ class frozendict(dict):
         try:
             return self._cached_hash
         except AttributeError:
-            h = self._cached_hash = hash(make_hashable(self))
+            h = _hash_items(self)
+            # subclasses may block __setattr__
+            object.__setattr__(self, "_cached_hash", h)
             return h
 
     def __repr__(self):
@@ -65,15 +102,29 @@ def deep_merge(dleft, dright, depth=-1, _clvl=0):
     
     from http://www.xormedia.com/recursively-merge-dictionaries-in-python/'''
 
+    return copy.deepcopy(cow_merge(dleft, dright, depth=depth, _clvl=_clvl))
+
+def cow_merge(dleft, dright, depth=-1, _clvl=0):
+    '''merges dict's like deep_merge, but nothing is copied except dict's
+    on the path of merged keys. Untouched subtrees of dleft and dright are
+    shared with result, so all of them must be treated as read-only.'''
+
     if not isinstance(dright, dict) or not isinstance(dleft, dict):
-        return copy.deepcopy(dright)
-    result = copy.deepcopy(dleft)
+        return dright
+    result = dict(dleft)
     for k, v in dright.iteritems():
         if _clvl != depth and k in result and isinstance(result[k], dict):
             _clvl += 1
-            result[k] = deep_merge(result[k], v, depth=depth, _clvl=_clvl)
+            result[k] = cow_merge(result[k], v, depth=depth, _clvl=_clvl)
         else:
-            result[k] = copy.deepcopy(v)
+            result[k] = v
+    return result
+
+def cow_update(dleft, dright):
+    '''like dict.update on copy of dleft, values are shared with result'''
+    result = dict(dleft)
+    if dright:
+        result.update(dright)
     return result
 
 def recursive_fmt(obj, repl):
@@ -88,6 +139,82 @@ def recursive_fmt(obj, repl):
     else:
         return obj 
 
+class ReplacementEngine(object):
+    '''Gives the same result as recursive_fmt, but rebuilds only containers
+    with strings which need formatting, others are returned as is.
+
+    Found places of such strings are cached by containers identity for one
+    next render, so subtrees shared between loads are not scanned again.
+    Cached containers must not be changed.'''
+
+    def __init__(self):
+        self._plans = {}
+        self._prev_plans = {}
+
+    def _plan(self, obj):
+        if isinstance(obj, basestring):
+            return "%" in obj
+        if not isinstance(obj, (dict, list, tuple)):
+            return None
+
+        key = id(obj)
+        entry = self._plans.get(key)
+        if entry is None:
+            entry = self._prev_plans.get(key)
+            if entry is not None and entry[0] is obj:
+                self._plans[key] = entry
+        if entry is not None and entry[0] is obj:
+            return entry[1]
+
+        plan = []
+        if isinstance(obj, dict):
+            for k, v in obj.iteritems():
+                key_plan = isinstance(k, basestring) and "%" in k
+                value_plan = self._plan(v)
+                if key_plan or value_plan:
+                    plan.append((k, key_plan, value_plan))
+        else:
+            for i, v in enumerate(obj):
+                value_plan = self._plan(v)
+                if value_plan:
+                    plan.append((i, value_plan))
+        plan = plan or None
+        # obj kept in cache, so its id is not reused while cached
+        self._plans[key] = (obj, plan)
+        return plan
+
+    def _render(self, obj, plan, repl):
+        if not plan:
+            return obj
+        if plan is True:
+            return obj % repl
+        if isinstance(obj, dict):
+            result = dict(obj)
+            changed = []
+            for k, key_plan, value_plan in plan:
+                value = self._render(obj[k], value_plan, repl)
+                if key_plan:
+                    del result[k]
+                    k = k % repl
+                changed.append((k, value))
+            result.update(changed)
+            return result
+
+        result = list(obj)
+        for i, value_plan in plan:
+            result[i] = self._render(obj[i], value_plan, repl)
+        if isinstance(obj, tuple):
+            result = tuple(result)
+        return result
+
+    def render(self, obj, repl):
+        try:
+            return self._render(obj, self._plan(obj), repl)
+        finally:
+            # keep only plans used by this render
+            self._prev_plans = self._plans
+            self._plans = {}
+
 def to_primitive(obj):
     if isinstance(obj, dict):
         return dict((to_primitive(k), to_primitive(v)) for (k, v) in obj.iteritems())
@@ -1,9 +1,12 @@
-from nodes import Node
+from nodes import Node, Dict, _ErrorCollector
+from ..exceptions import ValidatorConvertError, ValidatorCheckError
+from .compiler import compile_node, ValidationMemo
 
 __all__ = ["Validator"]
 
 class Validator(object):
-    def __init__(self, AVT, only_declared=False):
+    def __init__(self, AVT, only_declared=False, compiled=False,
+                 incremental=False, collect_errors=False, max_errors=None):
         if not isinstance(AVT, Node):
             raise TypeError("AVT must be %s instance, not %s" % (Node.__name__, type(AVT)))
 
@@ -13,11 +16,65 @@ class Validator(object):
         # TODO
         self._only_decl = only_declared
 
+        # collect-all mode walks nodes, not compiled checks
+        if collect_errors and (compiled or incremental):
+            raise ValueError("collect_errors can't be combined with compiled or incremental")
+        self._collect_errors = collect_errors
+        self._max_errors = max_errors
+        self._compiled = compiled or incremental
+        self._incremental = incremental
+        self._create_check()
+
+    def _create_check(self):
+        # incremental validation reuses results for lists and dicts with
+        # the same content as in previous validation
+        self._memo = None
+        if self._incremental:
+            self._memo = ValidationMemo()
+            self._check = compile_node(self._AVT, memo=self._memo)
+        elif self._compiled:
+            self._check = compile_node(self._AVT)
+        else:
+            self._check = self._AVT.check
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # compiled checks are closures
+        del state["_check"]
+        del state["_memo"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._create_check()
+
+    def declared_node(self, key):
+        """Node declared for top level key or None"""
+        AVT = self._AVT
+        if not isinstance(AVT, Dict):
+            return None
+        node = AVT._decl_prim_keys.get(key)
+        if node is None and AVT._decl_node_key is not None:
+            key_node, node = AVT._decl_node_key
+            try:
+                key_node.check(key)
+            except (ValidatorConvertError, ValidatorCheckError):
+                return None
+        return node
+
     def cleanup(self):
         pass
 
     def validate(self, data):
-        return self._AVT.check(data)
+        if self._collect_errors:
+            errors = _ErrorCollector(self._max_errors)
+            value = self._AVT._collect(data, "", errors)
+            errors.raise_errors()
+            return value
+
+        if self._memo is not None:
+            self._memo.next_generation()
+        return self._check(data)
 
 
 
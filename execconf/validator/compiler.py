@@ -0,0 +1,387 @@
+import hashlib
+import marshal
+import operator
+import threading
+from .nodes import (Node, Boolean, String, Integer, Float, Option, List,
+                    Dict, _ConvertErrorDummyMsg, _VALIDATOR_ERRORS)
+from ..exceptions import ValidatorConvertError, ValidatorCheckError
+
+__all__ = ["compile_node", "ValidationMemo"]
+
+_BOOLEAN_TRUE = ("true", "on", "yes", 1)
+_BOOLEAN_FALSE = ("false", "off", "no", 0)
+
+
+def _is_plain(node, cls, *names):
+    # node compiled only if it uses original methods of cls,
+    # subclasses with own checks stay as is
+    node_cls = type(node)
+    for name in names:
+        if getattr(node_cls, name).im_func is not getattr(cls, name).im_func:
+            return False
+    return True
+
+
+def _compile_pass(node, compile_child):
+    def check(value):
+        return value
+    return check
+
+
+def _compile_boolean(node, compile_child):
+    eq = node._eq
+
+    def check(value):
+        orig_value = value
+        if not isinstance(orig_value, bool):
+            if isinstance(orig_value, basestring):
+                value = orig_value.lower()
+            if value in _BOOLEAN_TRUE:
+                value = True
+            elif value in _BOOLEAN_FALSE:
+                value = False
+            else:
+                raise ValidatorConvertError(_ConvertErrorDummyMsg % ("Boolean", orig_value, type(orig_value)))
+        return value
+
+    if eq is None:
+        return check
+
+    def check_eq(value):
+        new_value = check(value)
+        if eq != new_value:
+            raise ValidatorCheckError("value %s not equal %s" % (value, eq))
+        return new_value
+    return check_eq
+
+
+def _compile_string(node, compile_child):
+    eq = node._eq
+    minlen = node._minlen
+    maxlen = node._maxlen
+
+    def convert(value):
+        if isinstance(value, basestring):
+            try:
+                return unicode(value)
+            except UnicodeError, e:
+                raise ValidatorConvertError(_ConvertErrorDummyMsg % ("String", value, e))
+        raise ValidatorConvertError(_ConvertErrorDummyMsg % ("String", value, type(value)))
+
+    checks = []
+    if minlen is not None:
+        checks.append((operator.lt, minlen, "value '%s' too short. %s"))
+    if maxlen is not None:
+        checks.append((operator.gt, maxlen, "value '%s' too long. %s"))
+
+    if eq is None and not checks:
+        return convert
+
+    def check(orig_value):
+        value = convert(orig_value)
+        if eq is not None and eq != value:
+            raise ValidatorCheckError("value '%s' not equal '%s'" % (orig_value, eq))
+        if checks:
+            vallen = len(value)
+            for fail, bound, msg in checks:
+                if fail(vallen, bound):
+                    except_ranges = "minlen=%s, maxlen=%s, len=%i" % (minlen, maxlen, vallen)
+                    raise ValidatorCheckError(msg % (orig_value, except_ranges))
+        return value
+    return check
+
+
+def _compile_integer(node, compile_child):
+    if isinstance(node, Float):
+        conv, name = float, "Float"
+    else:
+        conv, name = int, "Integer"
+
+    checks = []
+    for attr, fail, msg in (
+            ("_eq", operator.ne, "value %s not equal %s"),
+            ("_lt", operator.ge, "value %s not less than %s"),
+            ("_lte", operator.gt, "value %s not less and not equal than %s"),
+            ("_gt", operator.le, "value %s not greater than %s"),
+            ("_gte", operator.lt, "value %s not greater and not equal than %s"),
+            ("_min", operator.lt, "value %s less than %s"),
+            ("_max", operator.gt, "value %s greater than %s")):
+        bound = getattr(node, attr)
+        if bound is not None:
+            checks.append((fail, bound, msg))
+
+    def convert(value):
+        try:
+            return conv(value)
+        except (ValueError, TypeError, OverflowError):
+            raise ValidatorConvertError(_ConvertErrorDummyMsg % (name, value, type(value)))
+
+    if not checks:
+        check = convert
+    else:
+        def check(orig_value):
+            value = convert(orig_value)
+            for fail, bound, msg in checks:
+                if fail(value, bound):
+                    raise ValidatorCheckError(msg % (orig_value, bound))
+            return value
+
+    precision = getattr(node, "_precision", None)
+    if precision is None:
+        return check
+
+    powed_ten = pow(10, precision)
+    def check_precision(orig_value):
+        value = check(orig_value)
+        try:
+            return float(int(value * powed_ten))/powed_ten
+        except (ValueError, OverflowError):
+            raise ValidatorConvertError(_ConvertErrorDummyMsg % (name, orig_value, type(orig_value)))
+    return check_precision
+
+
+def _compile_option(node, compile_child):
+    options = node._options
+    compiled = dict((i, compile_child(o)) for i, o in node._nodes)
+    literal_position = node._literal_position
+    candidates = node._candidates
+
+    def check(value):
+        found = None
+        matched = False
+        pos = literal_position(value)
+        for i, o in candidates(value):
+            if pos is not None and i > pos:
+                break
+            try:
+                found = compiled[i](value)
+            except _VALIDATOR_ERRORS:
+                continue
+            matched = True
+            break
+        if not matched and pos is not None:
+            found = options[pos]
+
+        if found is None:
+            raise ValidatorCheckError("value %s not contains in options" % (value))
+        return found
+    return check
+
+
+def _compile_list(node, compile_child):
+    force = node._force
+    loop = node._loop
+
+    checks = []
+    if node._min is not None:
+        checks.append((operator.lt, node._min, "list size %i less than %i"))
+    if node._max is not None:
+        checks.append((operator.gt, node._max, "list size %i greater than %i"))
+
+    check_decl = None
+    if node._decl is not None:
+        decl = [compile_child(n) for n in node._decl]
+        decl_len = len(decl)
+        if decl_len == 1 and loop:
+            item_check = decl[0]
+            def check_decl(value):
+                return [item_check(item) for item in value]
+        else:
+            def check_decl(value):
+                new_value = []
+                for i, item in enumerate(value):
+                    if i < decl_len:
+                        item_check = decl[i]
+                    elif loop:
+                        item_check = decl[i % decl_len]
+                    else:
+                        raise ValidatorCheckError("list size %s greater than declared checks %s" % (len(value), decl_len))
+                    new_value.append(item_check(item))
+                return new_value
+
+    def check(orig_value):
+        if not isinstance(orig_value, (tuple, list)):
+            if force:
+                value = [orig_value]
+            else:
+                raise ValidatorConvertError(_ConvertErrorDummyMsg % ("List", orig_value, type(orig_value)))
+        else:
+            value = list(orig_value)
+
+        if checks:
+            vlen = len(value)
+            for fail, bound, msg in checks:
+                if fail(vlen, bound):
+                    raise ValidatorCheckError(msg % (vlen, bound))
+
+        if check_decl is not None:
+            value = check_decl(value)
+        return value
+    return check
+
+
+def _compile_dict(node, compile_child):
+    checks = []
+    if node._min is not None:
+        checks.append((operator.lt, node._min, "dict size %i less than %i"))
+    if node._max is not None:
+        checks.append((operator.gt, node._max, "dict size %i greater than %i"))
+    required = node._required
+
+    has_decl = node._decl is not None
+    prim_keys = {}
+    for k, v in node._decl_prim_keys.iteritems():
+        prim_keys[k] = compile_child(v)
+    node_key = None
+    if node._decl_node_key is not None:
+        node_key = (compile_child(node._decl_node_key[0]),
+                    compile_child(node._decl_node_key[1]))
+
+    def check(orig_value):
+        if not isinstance(orig_value, dict):
+            raise ValidatorConvertError(_ConvertErrorDummyMsg % ("Dict", orig_value, type(orig_value)))
+
+        if checks:
+            vlen = len(orig_value)
+            for fail, bound, msg in checks:
+                if fail(vlen, bound):
+                    raise ValidatorCheckError(msg % (vlen, bound))
+
+        if not has_decl:
+            value = orig_value.copy()
+        else:
+            value = {}
+            for k, v in orig_value.iteritems():
+                item_check = prim_keys.get(k)
+                if item_check is not None:
+                    value[k] = item_check(v)
+                elif node_key is not None:
+                    value[node_key[0](k)] = node_key[1](v)
+                else:
+                    value[k] = v
+
+        if required:
+            for item_name in required:
+                if item_name not in value:
+                    raise ValidatorCheckError("required item '%s' not found" % item_name)
+        return value
+    return check
+
+
+class ValidationMemo(object):
+    '''Results of container checks keyed by content of checked value.
+    Results of two last validations are kept, so value with the same
+    content as in previous validation is not checked again, even if it
+    was changed in place meanwhile. Values which can't be serialized by
+    marshal are always checked.'''
+
+    def __init__(self):
+        self._current = {}
+        self._previous = {}
+        # keys of nested containers checked by running checks
+        self._local = threading.local()
+
+    def __len__(self):
+        return len(self._current)
+
+    def __getstate__(self):
+        return {}
+
+    def __setstate__(self, state):
+        self.__init__()
+
+    def next_generation(self):
+        self._previous = self._current
+        self._current = {}
+
+    def clear(self):
+        self._current = {}
+        self._previous = {}
+
+    def _get(self, key):
+        current = self._current
+        entry = current.get(key)
+        if entry is None:
+            entry = self._previous.get(key)
+            if entry is not None:
+                # results of nested containers are kept with result of
+                # their parent
+                current[key] = entry
+                for child_key in entry[1]:
+                    self._get(child_key)
+        return entry
+
+    def wrap(self, check):
+        def memo_check(value):
+            if not isinstance(value, (dict, list, tuple)):
+                return check(value)
+            try:
+                # version 0 doesn't depend on interning of strings
+                raw = marshal.dumps(value, 0)
+            except ValueError:
+                return check(value)
+
+            key = (id(check), type(value), hashlib.sha1(raw).digest())
+            stack = self._local.__dict__.setdefault("stack", [])
+            if stack:
+                stack[-1].append(key)
+            entry = self._get(key)
+            if entry is not None:
+                return entry[0]
+
+            stack.append([])
+            try:
+                result = check(value)
+            finally:
+                child_keys = stack.pop()
+            self._current[key] = (result, child_keys)
+            return result
+        return memo_check
+
+
+# most specific classes first
+_COMPILERS = (
+    (Float, ("check", "convert"), _compile_integer),
+    (Integer, ("check", "convert"), _compile_integer),
+    (Boolean, ("check",), _compile_boolean),
+    (String, ("check",), _compile_string),
+    (Option, ("check",), _compile_option),
+    (List, ("check", "_check_decl"), _compile_list),
+    (Dict, ("check",), _compile_dict),
+    (Node, ("check",), _compile_pass)
+)
+
+
+def compile_node(node, memo=None):
+    '''Compile Abstract Validation Tree to check function. Function returns
+    the same result and raises the same errors as node.check, but
+    contains only checks which are set in nodes. If ValidationMemo is
+    given, results of list and dict checks are memoized in it.'''
+    compiled = {}
+
+    def compile_child(child):
+        try:
+            return compiled[id(child)][1]
+        except KeyError:
+            pass
+
+        check = None
+        if not isinstance(child, Node):
+            # validation files may keep constants next to nodes, like
+            # node.check they fail only when value is checked by them
+            def check(value):
+                return child.check(value)
+        for cls, names, compiler in _COMPILERS:
+            if isinstance(child, cls):
+                if _is_plain(child, cls, *names):
+                    check = compiler(child, compile_child)
+                break
+        if check is None:
+            check = child.check
+        if memo is not None and isinstance(child, (List, Dict)):
+            check = memo.wrap(check)
+        # keep node alive while its id is used as key
+        compiled[id(child)] = (child, check)
+        return check
+
+    return compile_child(node)
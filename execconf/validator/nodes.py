@@ -1,5 +1,6 @@
+from types import InstanceType
 from ..exceptions import ValidatorConvertError, ValidatorCheckError, \
-                         ValidatorNodeError
+                         ValidatorNodeError, ValidatorErrors
 
 __all__ = ["Node", "DeclNode", "Boolean", "Integer", "Float", "String",
            "List", "ListBoolean", "ListInteger", "ListFloat", "ListString",
@@ -7,21 +8,123 @@ __all__ = ["Node", "DeclNode", "Boolean", "Integer", "Float", "String",
 
 _ConvertErrorDummyMsg = "%s: value '%s' can't convert: %s"
 
+# shared instances of nodes created without arguments
+_interned = {}
+
+# result of _collect for invalid value
+_INVALID = object()
+
+_VALIDATOR_ERRORS = (ValidatorConvertError, ValidatorCheckError)
+
+# values which fail conversion to boolean and number
+_NOT_SCALAR = (dict, list, tuple, set, frozenset, type(None))
+
+
+def _join_key(path, key):
+    if not path:
+        return "%s" % (key,)
+    return "%s.%s" % (path, key)
+
+
+class _ErrorCollector(object):
+    """Errors of collect-all validation, validation stops when
+    more than max_errors are found"""
+
+    def __init__(self, max_errors=None):
+        assert max_errors is None or max_errors >= 1
+        self._max_errors = max_errors
+        self.errors = []
+
+    def add(self, path, error):
+        if self._max_errors is not None and len(self.errors) >= self._max_errors:
+            raise ValidatorErrors(self.errors, truncated=True)
+        self.errors.append((path, error))
+
+    def raise_errors(self):
+        if self.errors:
+            raise ValidatorErrors(self.errors)
+
+def _node_accepts(node, value):
+    # _accepts is written for checks of class which defines it,
+    # subclass with own check or convert may accept more types
+    node_cls = type(node)
+    for cls in node_cls.__mro__:
+        if "_accepts" in cls.__dict__:
+            break
+    for name in ("check", "convert"):
+        method = getattr(cls, name, None)
+        if method is not None and \
+                getattr(node_cls, name).im_func is not method.im_func:
+            return True
+    return node._accepts(value)
+
+
+class _NodeMeta(type):
+    def __call__(cls, *args, **kwargs):
+        # nodes are immutable, so node without arguments may be shared.
+        # Only for classes with own __slots__, other subclasses may keep
+        # some state in __dict__
+        if args or kwargs or "__slots__" not in cls.__dict__:
+            return super(_NodeMeta, cls).__call__(*args, **kwargs)
+        try:
+            return _interned[cls]
+        except KeyError:
+            node = _interned[cls] = super(_NodeMeta, cls).__call__()
+            return node
+
+
 class Node(object):
+    __metaclass__ = _NodeMeta
+    __slots__ = ()
+
+    def __getstate__(self):
+        state = {}
+        for cls in type(self).__mro__:
+            for name in cls.__dict__.get("__slots__", ()):
+                if hasattr(self, name):
+                    state[name] = getattr(self, name)
+        if hasattr(self, "__dict__"):
+            state.update(self.__dict__)
+        return state
+
+    def __setstate__(self, state):
+        for k, v in state.iteritems():
+            object.__setattr__(self, k, v)
+
     def check(self, value):
         return value
 
+    def _accepts(self, value):
+        """False if check surely fails for type of value. Result must
+        depend only on type of value, Option caches it by type for nodes
+        of this module. It's not used for subclasses which override check
+        or convert"""
+        return True
+
+    def _collect(self, value, path, errors):
+        """Like check, but errors are added to errors collector and
+        _INVALID is returned"""
+        try:
+            return self.check(value)
+        except _VALIDATOR_ERRORS, e:
+            errors.add(path, e)
+            return _INVALID
+
 
 class DeclNode(Node):
+    __slots__ = ("_decl",)
+
     def __init__(self, decl):
         self._decl = decl
 
 
 class Pass(Node):
-    pass
+    __slots__ = ()
 
 
 class Boolean(Node):
+    __slots__ = ("_eq",)
+
     def __init__(self, eq=None):
         self._eq = eq
 
@@ -43,8 +146,13 @@ class Boolean(Node):
                 raise ValidatorCheckError("value %s not equal %s" % (orig_value, eq))
         return value
 
+    def _accepts(self, value):
+        return not isinstance(value, _NOT_SCALAR)
+
 
 class String(Node):
+    __slots__ = ("_eq", "_minlen", "_maxlen")
+
     def __init__(self, eq=None, min=None, max=None):
         assert min is None or min >= 0
         assert max is None or max >= 1
@@ -84,8 +192,13 @@ class String(Node):
 
         return value
 
+    def _accepts(self, value):
+        return isinstance(value, basestring)
+
 
 class Integer(Node):
+    __slots__ = ("_eq", "_lt", "_gt", "_lte", "_gte", "_min", "_max")
+
     def __init__(self,
             eq=None,
             lt=None, gt=None,
@@ -122,7 +235,7 @@ class Integer(Node):
     def convert(self, value):
         try:
             return int(value)
-        except (ValueError, TypeError):
+        except (ValueError, TypeError, OverflowError):
             raise ValidatorConvertError(_ConvertErrorDummyMsg % ("Integer", value, type(value)))
     
     def check(self, value):
@@ -160,8 +273,13 @@ class Integer(Node):
 
         return value
 
+    def _accepts(self, value):
+        return not isinstance(value, _NOT_SCALAR)
+
 
 class Float(Integer):
+    __slots__ = ("_precision",)
+
     def __init__(self, eq=None, precision=None, **kwargs):
         super(Float, self).__init__(eq=eq, **kwargs)
 
@@ -172,7 +290,7 @@ class Float(Integer):
     def convert(self, value):
         try:
             return float(value)
-        except (ValueError, TypeError):
+        except (ValueError, TypeError, OverflowError):
             raise ValidatorConvertError(_ConvertErrorDummyMsg % ("Float", value,type(value)))
 
     def check(self, value):
@@ -182,26 +300,99 @@ class Float(Integer):
         precision = self._precision
         if precision is not None:
             powed_ten = pow(10, precision)
-            value = float(int(value * powed_ten))/powed_ten
+            try:
+                value = float(int(value * powed_ten))/powed_ten
+            except (ValueError, OverflowError):
+                # inf and nan
+                raise ValidatorConvertError(_ConvertErrorDummyMsg % ("Float", orig_value, type(orig_value)))
         return value
 
+    def _accepts(self, value):
+        return not isinstance(value, _NOT_SCALAR)
+
 
 class Option(Node):
+    __slots__ = ("_options", "_literals", "_unhashable", "_nodes",
+                 "_type_nodes")
+
     def __init__(self, *options):
         self._options = options
 
-    def check(self, value):
-        found = None
-        for o in self._options:
+        # options are matched in declaration order, so positions are kept.
+        # Literal -> position of first equal literal
+        literals = {}
+        unhashable = []
+        nodes = []
+        for i, o in enumerate(options):
             if isinstance(o, Node):
+                nodes.append((i, o))
+            else:
                 try:
-                    found = o.check(value)
-                    break
-                except:
-                    pass
-            elif value == o:
-                found = o
+                    literals.setdefault(o, i)
+                except TypeError:
+                    unhashable.append((i, o))
+        self._literals = literals
+        self._unhashable = tuple(unhashable)
+        self._nodes = tuple(nodes)
+        # type of value -> nodes which accept it. Only for nodes of this
+        # module, _accepts of other classes may look at more than type
+        self._type_nodes = None
+        if all(type(o).__module__ == __name__ for i, o in nodes):
+            self._type_nodes = {}
+
+    def __getstate__(self):
+        state = Node.__getstate__(self)
+        # cache depends on checked values, it's filled again
+        if state["_type_nodes"] is not None:
+            state["_type_nodes"] = {}
+        return state
+
+    def _literal_position(self, value):
+        try:
+            pos = self._literals.get(value)
+        except TypeError:
+            # unhashable value may be equal to hashable literal,
+            # e.g. set and frozenset
+            for i, o in enumerate(self._options):
+                if not isinstance(o, Node) and value == o:
+                    return i
+            return None
+        for i, o in self._unhashable:
+            if pos is not None and i > pos:
+                break
+            if value == o:
+                return i
+        return pos
+
+    def _candidates(self, value):
+        type_nodes = self._type_nodes
+        value_type = type(value)
+        # all old-style instances have the same type
+        if type_nodes is None or value_type is InstanceType:
+            return [(i, o) for i, o in self._nodes if _node_accepts(o, value)]
+        try:
+            return type_nodes[value_type]
+        except KeyError:
+            pass
+        nodes = tuple((i, o) for i, o in self._nodes if _node_accepts(o, value))
+        type_nodes[value_type] = nodes
+        return nodes
+
+    def check(self, value):
+        found = None
+        matched = False
+        pos = self._literal_position(value)
+        for i, o in self._candidates(value):
+            if pos is not None and i > pos:
                 break
+            try:
+                found = o.check(value)
+            except _VALIDATOR_ERRORS:
+                continue
+            matched = True
+            break
+        if not matched and pos is not None:
+            found = self._options[pos]
         
         if found is None:
             raise ValidatorCheckError("value %s not contains in options" % (value))
@@ -209,6 +400,8 @@ class Option(Node):
 
 
 class List(DeclNode):
+    __slots__ = ("_force", "_min", "_max", "_loop")
+
     def __init__(self, decl=None, force=False, min=None, max=None, loop=True):
         super(List, self).__init__(decl)
         
@@ -271,33 +464,79 @@ class List(DeclNode):
 
         return value
 
+    def _accepts(self, value):
+        return self._force or isinstance(value, (tuple, list))
+
+    def _collect(self, value, path, errors):
+        if type(self).check.im_func is not List.check.im_func or \
+                type(self)._check_decl.im_func is not List._check_decl.im_func:
+            return Node._collect(self, value, path, errors)
+
+        orig_value = value
+        if not isinstance(orig_value, (tuple, list)):
+            if self._force:
+                value = [orig_value]
+            else:
+                errors.add(path, ValidatorConvertError(_ConvertErrorDummyMsg % ("List", value, type(orig_value))))
+                return _INVALID
+
+        vlen = len(value)
+        if self._min is not None and vlen < self._min:
+            errors.add(path, ValidatorCheckError("list size %i less than %i" % (vlen, self._min)))
+        if self._max is not None and vlen > self._max:
+            errors.add(path, ValidatorCheckError("list size %i greater than %i" % (vlen, self._max)))
+
+        decl = self._decl
+        if decl is None:
+            return list(value)
+
+        decl_len = len(decl)
+        if not self._loop and vlen > decl_len:
+            errors.add(path, ValidatorCheckError("list size %s greater than declared checks %s" % (vlen, decl_len)))
+            value = value[:decl_len]
+        return [decl[i % decl_len]._collect(item, "%s[%i]" % (path, i), errors)
+                for i, item in enumerate(value)]
+
 
 class ListBoolean(List):
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super(ListBoolean, self).__init__([Boolean()], loop=True, **kwargs)
 
 
 class ListInteger(List):
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super(ListInteger, self).__init__([Integer()], loop=True, **kwargs)
 
 
 class ListFloat(List):
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super(ListFloat, self).__init__([Float()], loop=True, **kwargs)
 
 
 class ListString(List):
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super(ListString, self).__init__([String()], loop=True, **kwargs)
 
 
 class ListDict(List):
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super(ListDict, self).__init__([Dict()], loop=True, **kwargs)
 
 
 class Dict(DeclNode):
+    __slots__ = ("_min", "_max", "_required", "_decl_prim_keys",
+                 "_decl_node_key")
+
     def __init__(self, decl=None, min=None, max=None, required=None):
         super(Dict, self).__init__(decl)
         
@@ -369,6 +608,48 @@ class Dict(DeclNode):
 
         return value
 
+    def _accepts(self, value):
+        return isinstance(value, dict)
+
+    def _collect(self, value, path, errors):
+        if type(self).check.im_func is not Dict.check.im_func:
+            return Node._collect(self, value, path, errors)
+
+        if not isinstance(value, dict):
+            errors.add(path, ValidatorConvertError(_ConvertErrorDummyMsg % ("Dict", value, type(value))))
+            return _INVALID
+
+        vlen = len(value)
+        if self._min is not None and vlen < self._min:
+            errors.add(path, ValidatorCheckError("dict size %i less than %i" % (vlen, self._min)))
+        if self._max is not None and vlen > self._max:
+            errors.add(path, ValidatorCheckError("dict size %i greater than %i" % (vlen, self._max)))
+
+        if self._decl is None:
+            new_value = value.copy()
+        else:
+            new_value = {}
+            prim_keys = self._decl_prim_keys
+            decl_node_key = self._decl_node_key
+            for k, v in value.iteritems():
+                item_path = _join_key(path, k)
+                if k in prim_keys:
+                    new_value[k] = prim_keys[k]._collect(v, item_path, errors)
+                elif decl_node_key is not None:
+                    new_key = decl_node_key[0]._collect(k, item_path, errors)
+                    new_item = decl_node_key[1]._collect(v, item_path, errors)
+                    if new_key is not _INVALID:
+                        new_value[new_key] = new_item
+                else:
+                    new_value[k] = v
+
+        if self._required:
+            for item_name in self._required:
+                if item_name not in new_value and item_name not in value:
+                    errors.add(_join_key(path, item_name),
+                               ValidatorCheckError("required item '%s' not found" % item_name))
+        return new_value
+
 
 LOADER_GLOBALS = {
     "Boolean": Boolean,
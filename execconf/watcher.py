@@ -0,0 +1,247 @@
+import os
+import sys
+from os import path
+import errno
+import traceback
+import select
+import struct
+import threading
+import ctypes
+import ctypes.util
+
+__all__ = ["ConfigWatcher"]
+
+
+class _StatPoller(object):
+    """Checks stat of all watched files once per wait"""
+
+    def __init__(self, stopped):
+        self._stopped = stopped
+        self._stats = {}
+
+    def _stat(self, filepath):
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            return None
+        return (st.st_mtime, st.st_size, st.st_ino)
+
+    def watch(self, filepaths):
+        self._stats = dict((fp, self._stat(fp)) for fp in filepaths)
+
+    def wait(self, timeout):
+        self._stopped.wait(timeout)
+        changed = False
+        stats = self._stats
+        for filepath, stat in stats.items():
+            new_stat = self._stat(filepath)
+            if new_stat != stat:
+                stats[filepath] = new_stat
+                changed = True
+        return changed
+
+    def close(self):
+        pass
+
+
+class _InotifyPoller(object):
+    """Watches directories of files, so replacing file by rename
+    is noticed too"""
+
+    _EVENT = struct.Struct("iIII")
+    _MASK = (0x2 |    # IN_MODIFY
+             0x4 |    # IN_ATTRIB
+             0x8 |    # IN_CLOSE_WRITE
+             0x40 |   # IN_MOVED_FROM
+             0x80 |   # IN_MOVED_TO
+             0x100 |  # IN_CREATE
+             0x200)   # IN_DELETE
+
+    def __init__(self, stopped):
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            raise OSError("libc not found")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, "inotify_init"):
+            raise OSError("inotify is not supported")
+        fd = libc.inotify_init()
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init failed")
+        self._libc = libc
+        self._fd = fd
+        self._watches = {}
+        self._filepaths = set()
+
+    def watch(self, filepaths):
+        self._filepaths = set(filepaths)
+        directories = set(path.dirname(fp) for fp in self._filepaths)
+        watches = self._watches
+        for wd, directory in watches.items():
+            if directory not in directories:
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del watches[wd]
+        watched = set(watches.itervalues())
+        for directory in directories - watched:
+            wd = self._libc.inotify_add_watch(self._fd, directory, self._MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(),
+                              "inotify_add_watch failed: %s" % directory)
+            watches[wd] = directory
+
+    def wait(self, timeout):
+        try:
+            ready, _, _ = select.select([self._fd], [], [], timeout)
+        except select.error, e:
+            if e.args[0] == errno.EINTR:
+                return False
+            raise
+        if not ready:
+            return False
+
+        buf = os.read(self._fd, 65536)
+        changed = False
+        offset = 0
+        event_size = self._EVENT.size
+        while offset + event_size <= len(buf):
+            wd, mask, cookie, name_len = self._EVENT.unpack_from(buf, offset)
+            offset += event_size
+            name = buf[offset:offset + name_len].rstrip("\0")
+            offset += name_len
+            directory = self._watches.get(wd)
+            if directory is not None and path.join(directory, name) in self._filepaths:
+                changed = True
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+class ConfigWatcher(object):
+    """Loads config again in background thread when any of its files is
+    changed and publishes new Config to subscribers and queue.
+
+    Loader is used only by watcher thread after start(). Persistent loader
+    re-executes only changed files. Errors of load and of callbacks are
+    passed to errbacks, without errbacks they are printed to stderr."""
+
+    def __init__(self, loader, filepath, extra=None,
+                 interval=1.0, debounce=0.2, use_inotify=True,
+                 queue=None):
+        self._loader = loader
+        self._filepath = filepath
+        self._extra = extra
+        self._interval = interval
+        self._debounce = debounce
+        self._queue = queue
+        self._callbacks = []
+        self._errbacks = []
+        self._use_inotify = use_inotify
+        self._stopped = threading.Event()
+        self._thread = None
+        self._poller = None
+
+        self.config = None
+        self.error = None
+
+    def subscribe(self, callback, errback=None):
+        self._callbacks.append(callback)
+        if errback is not None:
+            self._errbacks.append(errback)
+
+    def unsubscribe(self, callback):
+        try:
+            self._callbacks.remove(callback)
+        except ValueError:
+            pass
+
+    def _create_poller(self):
+        if self._use_inotify:
+            try:
+                return _InotifyPoller(self._stopped)
+            except (OSError, AttributeError):
+                pass
+        return _StatPoller(self._stopped)
+
+    def _watch(self):
+        # sources of failed load are files it tried to load,
+        # so fixed file triggers reload. Absent files change
+        # config when they are created
+        loader = self._loader
+        filepaths = loader.sources() + loader.absent()
+        try:
+            self._poller.watch(filepaths)
+        except OSError:
+            # e.g. limit of inotify watches is reached or directory
+            # of absent file doesn't exist
+            self._poller.close()
+            self._poller = _StatPoller(self._stopped)
+            self._poller.watch(filepaths)
+
+    def _report(self, error):
+        if not self._errbacks:
+            traceback.print_exc(file=sys.stderr)
+        for errback in list(self._errbacks):
+            try:
+                errback(error)
+            except Exception:
+                traceback.print_exc(file=sys.stderr)
+
+    def start(self):
+        if self._thread is not None:
+            raise RuntimeError("watcher is already started")
+        if self._poller is None:
+            self._poller = self._create_poller()
+        self.config = self._loader.load(self._filepath, extra=self._extra)
+        self._watch()
+
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name="execconf-watcher")
+        self._thread.daemon = True
+        self._thread.start()
+        return self.config
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        # poller is created again by next start
+        if self._poller is not None:
+            self._poller.close()
+            self._poller = None
+
+    def _run(self):
+        stopped = self._stopped
+        while not stopped.is_set():
+            # poller is replaced if it fails to watch files
+            if not self._poller.wait(self._interval):
+                continue
+            # wait for the end of changes burst
+            while not stopped.is_set() and self._poller.wait(self._debounce):
+                pass
+            if not stopped.is_set():
+                try:
+                    self._rebuild()
+                except Exception, e:
+                    self._report(e)
+
+    def _rebuild(self):
+        try:
+            conf = self._loader.load(self._filepath, extra=self._extra)
+        except Exception, e:
+            self.error = e
+            self._report(e)
+            self._watch()
+            return
+
+        self.error = None
+        self.config = conf
+        self._watch()
+        for callback in list(self._callbacks):
+            try:
+                callback(conf)
+            except Exception, e:
+                self._report(e)
+        if self._queue is not None:
+            self._queue.put(conf)
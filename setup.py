@@ -24,6 +24,7 @@ setup(name="execconf",
       url="https://github.com/DriverX/execconf",
       license="http://opensource.org/licenses/MIT",
       packages=["execconf",
+                "execconf.benchmarks",
                 "execconf.tests",
                 "execconf.validator"],
       include_package_data=True,